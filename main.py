@@ -88,7 +88,8 @@ def process_single_drive(
             drive_state_dir=drive_state_dir,
             processed_shared_drive_ids=processed_drive_ids,
             incremental_flag=incremental_flag,
-            dry_run=dry_run
+            dry_run=dry_run,
+            creds=creds
         )
         
         log.info(f"✅ Completed parallel processing of drive: {drive_name} - P:{processed}/D:{downloaded}/Del:{deleted}/F:{failed} (Mode: {actual_mode})")
@@ -98,15 +99,6 @@ def process_single_drive(
         log.error(f"❌ Error processing drive {drive.get('name', 'Unknown')}: {e}", exc_info=True)
         return 0, 0, 0, 1, drive.get('name', 'Unknown')  # Return 1 failure
 
-# --- Try importing Boto3 for S3 (this is now handled in s3.py, but keep for dummy exceptions) ---
-if config.BOTO3_AVAILABLE:
-    import boto3 # boto3 import itself is fine here
-    from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
-else:
-    NoCredentialsError = type('NoCredentialsError', (Exception,), {})
-    PartialCredentialsError = type('PartialCredentialsError', (Exception,), {})
-    ClientError = type('ClientError', (Exception,), {})
-
 def process_shared_drives(
     creds: Any,
     incremental_flag: bool,
@@ -296,7 +288,8 @@ def main():
             drive_state_dir=config.STATE_DIR / "My Drive",
             processed_shared_drive_ids=processed_drive_ids,
             incremental_flag=args.incremental,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            creds=creds
         )
         # Calculate totals
         total_processed = shared_processed + my_drive_processed
@@ -401,6 +394,7 @@ def main():
             log.info(f"  SSL errors: {stats['ssl_errors']}")
             log.info(f"  Error rate: {stats['error_rate']:.2f}%")
             log.info(f"  Final delay: {stats['current_delay']:.3f}s")
+            log.info(f"  Throttled retries: {stats['throttle_waits']} ({stats['throttle_wait_seconds']:.1f}s waited)")
         
         # Write final summary to log file
         driveup_logger.write_summary()
@@ -413,4 +407,8 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    exit(main()) 
\ No newline at end of file
+    try:
+        exit_code = main()
+    finally:
+        driveup_logger.shutdown()
+    exit(exit_code)
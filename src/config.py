@@ -25,6 +25,14 @@ except ImportError:
     PartialCredentialsError = type('PartialCredentialsError', (Exception,), {})
     ClientError = type('ClientError', (Exception,), {})
 
+# --- Try importing orjson (fast JSON for state files) ---
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None # Placeholder
+
 import coloredlogs
 
 # --- Load Environment Variables ---
@@ -76,6 +84,16 @@ DRY_RUN_MAX_FILE_SIZE_BYTES = dry_run_max_size_mb * 1024 * 1024
 max_export_size_mb = get_int_env("MAX_EXPORT_SIZE_MB", 50)  # Google Docs export limit is around 50MB
 MAX_EXPORT_SIZE_BYTES = max_export_size_mb * 1024 * 1024
 
+# Number of parallel part uploads used for S3 archive uploads
+S3_UPLOAD_CONCURRENCY = get_int_env("S3_UPLOAD_CONCURRENCY", 10)
+
+# Number of files downloaded in parallel per sync (1 = download sequentially on the calling thread)
+DOWNLOAD_CONCURRENCY = get_int_env("DOWNLOAD_CONCURRENCY", 4)
+
+# 1 = drop downloaded files from the OS page cache once written (posix_fadvise DONTNEED).
+# Off by default: the archive step reads the files back right after the backup
+DROP_DOWNLOAD_PAGE_CACHE = get_int_env("DROP_DOWNLOAD_PAGE_CACHE", 0)
+
 # --- Logging Setup ---
 log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
 valid_log_levels = {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}
@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import email.utils
+import functools
 import logging
+import os
+import random
+import sys
 import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional, Any, Tuple, List
+from typing import BinaryIO, Dict, Iterable, Optional, Any, Tuple, List
 
 # External libraries
 import tqdm
@@ -16,6 +22,7 @@ from googleapiclient.http import MediaIoBaseDownload
 # Local imports
 from . import utils # For sanitize_filename, int_to_column_letter
 from . import config # Ensure config is imported
+from . import rate_limiter
 from .logger import driveup_logger
 
 log = logging.getLogger(__name__)
@@ -24,6 +31,136 @@ log = logging.getLogger(__name__)
 # Needs careful handling if script becomes multi-threaded or long-running with state changes.
 item_cache: Dict[str, Dict] = {}
 
+# Resolved local path of each folder, keyed by (folder_id, drive_backup_dir): siblings share one ancestor walk.
+# Cleared by refresh_cached_item when a folder is renamed, moved or removed.
+folder_path_cache: Dict[Tuple[str, Path], Path] = {}
+
+# Memoized sanitize_filename: the same folder names are sanitized for every descendant
+_sanitize = functools.lru_cache(maxsize=131072)(utils.sanitize_filename)
+
+# Minimum progress (bytes) accumulated before the download progress bar is updated
+PBAR_MIN_UPDATE_BYTES = 4 << 20
+
+def sheet_has_formulas(formula_rows: List[List[Any]]) -> bool:
+    """Returns True if any cell of a FORMULA-rendered worksheet contains a formula (starts with '=')."""
+    return any(isinstance(cell, str) and cell.startswith("=") for row in formula_rows for cell in row)
+
+# Drive batch requests accept at most 100 sub-requests
+BATCH_MAX_REQUESTS = 100
+
+# Throttled downloads (429, 5xx, 403 rate limits; after the client library's own retries) are retried this many times
+MAX_THROTTLE_RETRIES = 5
+MAX_THROTTLE_WAIT_SECONDS = 64
+
+# 403 reasons Drive uses for quota throttling (as opposed to permission errors)
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+
+def _is_throttled(error: HttpError) -> bool:
+    """True for responses worth retrying later: 429, 5xx and 403 rateLimitExceeded/userRateLimitExceeded."""
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status != 403:
+        return False
+    details = getattr(error, "error_details", None)
+    if isinstance(details, list):
+        if any(isinstance(detail, dict) and detail.get("reason") in RATE_LIMIT_REASONS for detail in details):
+            return True
+    content = error.content or b""
+    if isinstance(content, str):
+        content = content.encode("utf-8", "replace")
+    return any(reason.encode() in content for reason in RATE_LIMIT_REASONS)
+
+def _throttle_wait(error: HttpError, attempt: int) -> float:
+    """
+    Seconds to wait before retrying a throttled call: the server's Retry-After (delay-seconds or HTTP-date)
+    if given, else jittered exponential backoff.
+    """
+    retry_after = (error.resp.get("retry-after") or "").strip()
+    if retry_after.isdigit():
+        return min(float(retry_after), MAX_THROTTLE_WAIT_SECONDS)
+    if retry_after:
+        try:
+            retry_at = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            retry_at = None
+        if retry_at is not None:
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+            return min(max(delay, 0.0), MAX_THROTTLE_WAIT_SECONDS)
+    return min(2 ** attempt, MAX_THROTTLE_WAIT_SECONDS) + random.uniform(0, 1)
+
+def prefetch_parents(
+    service: Resource,
+    parent_ids: Iterable[str],
+    drive_id: Optional[str],
+    max_retries: int = 3
+) -> int:
+    """
+    Resolves uncached parent folders, and their ancestors, into item_cache using batched files.get calls,
+    so reconstruct_and_create_path builds paths from the cache instead of one round-trip per ancestor.
+    Throttled sub-requests (429, 5xx, 403 rate limits) are retried with backoff; other failures are left uncached
+    for reconstruct_and_create_path to handle as before. Returns the number of items fetched.
+    """
+    fetched = 0
+    pending = {pid for pid in parent_ids if pid and pid != drive_id and pid not in item_cache}
+    retry_attempt = 0
+    depth = 0
+    limiter = rate_limiter.get_rate_limiter()
+
+    while pending and depth <= config.MAX_PATH_RECONSTRUCTION_DEPTH:
+        results: Dict[str, Dict] = {}
+        retry_ids = set()
+
+        def _on_response(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+                return
+            if isinstance(exception, HttpError) and _is_throttled(exception):
+                retry_ids.add(request_id)
+            else:
+                log.debug("[Path] Batched lookup of parent %s failed: %s", request_id, exception)
+
+        pending_list = list(pending)
+        try:
+            for start in range(0, len(pending_list), BATCH_MAX_REQUESTS):
+                batch = service.new_batch_http_request(callback=_on_response)
+                for parent_id in pending_list[start:start + BATCH_MAX_REQUESTS]:
+                    batch.add(
+                        service.files().get(fileId=parent_id, fields="id, name, parents, mimeType", supportsAllDrives=True),
+                        request_id=parent_id
+                    )
+                with limiter:
+                    batch.execute()
+        except Exception as e:
+            # Not fatal: reconstruct_and_create_path falls back to per-parent requests
+            log.warning("[Path] Batched parent lookup failed, falling back to per-item requests: %s", e)
+            item_cache.update(results)
+            return fetched + len(results)
+
+        item_cache.update(results)
+        fetched += len(results)
+
+        if retry_ids and retry_attempt < max_retries:
+            retry_attempt += 1
+            wait_time = (2 ** retry_attempt) + random.uniform(0, 1)
+            log.warning("[Path] %d batched parent lookups throttled or failed server-side. Retrying in %.1fs...",
+                        len(retry_ids), wait_time)
+            time.sleep(wait_time)
+        else:
+            retry_ids = set()
+
+        # Next round: throttled lookups plus the not-yet-cached parents of what was just fetched
+        pending = set(retry_ids)
+        for details in results.values():
+            grandparents = details.get("parents")
+            if grandparents and grandparents[0] != drive_id and grandparents[0] not in item_cache:
+                pending.add(grandparents[0])
+        depth += 1
+
+    return fetched
+
 def reconstruct_and_create_path(
     service: Resource,
     item_id: str,
@@ -56,7 +193,7 @@ def reconstruct_and_create_path(
     # Let's assume if it's not the Shared Drive root, we need to look up the parent.
 
     if is_root:
-        local_path = drive_backup_dir / utils.sanitize_filename(item_name)
+        local_path = drive_backup_dir / _sanitize(item_name)
         # The directory will be created later if it's a folder
         # Files will have their parent dir created by download_file
         return local_path
@@ -64,6 +201,11 @@ def reconstruct_and_create_path(
     # If not root, there must be a parent_id
     parent_id = item_parents[0]
 
+    # Parent folder already resolved (and created) for an earlier item
+    cached_parent_path = folder_path_cache.get((parent_id, drive_backup_dir))
+    if cached_parent_path is not None:
+        return cached_parent_path / _sanitize(item_name)
+
     # Check cache for the parent
     parent_details = item_cache.get(parent_id)
 
@@ -91,7 +233,7 @@ def reconstruct_and_create_path(
             if e.resp.status == 404:
                  log.warning("[Path] Parent %s not found. Placing item %s (%s) directly in drive backup root: %s", parent_id, item_name, item_id, drive_backup_dir)
                  # Return path in the root for this item
-                 return drive_backup_dir / utils.sanitize_filename(item_name)
+                 return drive_backup_dir / _sanitize(item_name)
             return None # Other API error
         except Exception as e:
              log.error("[Path] Unknown error requesting parent %s: %s", parent_id, e)
@@ -113,10 +255,10 @@ def reconstruct_and_create_path(
         log.error("[Path] Failed to reconstruct path for parent %s of item %s (%s)", parent_id, item_name, item_id)
         # Fallback: place the current item in the drive root
         log.warning("[Path] Placing item %s (%s) in drive backup root due to parent path failure: %s", item_name, item_id, drive_backup_dir)
-        return drive_backup_dir / utils.sanitize_filename(item_name)
+        return drive_backup_dir / _sanitize(item_name)
 
     # Construct the full path for the current item
-    current_local_path = parent_local_path / utils.sanitize_filename(item_name)
+    current_local_path = parent_local_path / _sanitize(item_name)
 
     # --- Create the parent's local directory IF it represents a folder --- #
     # This is crucial: We need the parent's *local* path to exist *before* returning the child's path,
@@ -131,23 +273,75 @@ def reconstruct_and_create_path(
                 log.error("[Path] Failed to create local folder for parent %s: %s", parent_local_path, e)
                 # If we can't create the parent dir, we cannot place the child correctly.
                 log.warning("[Path] Placing item %s (%s) in drive backup root due to parent dir creation failure: %s", item_name, item_id, drive_backup_dir)
-                return drive_backup_dir / utils.sanitize_filename(item_name)
+                return drive_backup_dir / _sanitize(item_name)
         elif not parent_local_path.is_dir():
              log.error("[Path] Expected parent path to be a directory, but it is not: %s", parent_local_path)
              # Fallback: place the current item in the drive root
              log.warning("[Path] Placing item %s (%s) in drive backup root due to parent path conflict: %s", item_name, item_id, drive_backup_dir)
-             return drive_backup_dir / utils.sanitize_filename(item_name)
+             return drive_backup_dir / _sanitize(item_name)
+        folder_path_cache[(parent_id, drive_backup_dir)] = parent_local_path
 
     return current_local_path
 
+def refresh_cached_item(item: Dict[str, Any]):
+    """
+    Keeps the path caches consistent with a change reported for item.
+    A renamed, moved or trashed folder invalidates every cached folder path (descendants derive from it).
+    """
+    item_id = item.get("id")
+    cached = item_cache.get(item_id)
+    if cached is None:
+        return
+    if item.get("trashed", False):
+        del item_cache[item_id]
+        folder_path_cache.clear()
+    elif cached.get("name") != item.get("name") or cached.get("parents") != item.get("parents"):
+        item_cache[item_id] = {key: item.get(key) for key in ("id", "name", "parents", "mimeType")}
+        folder_path_cache.clear()
+
+def cache_listed_folders(items: Iterable[Dict[str, Any]]) -> int:
+    """
+    Adds the folders of a listing page to item_cache, so parents that were listed already resolve
+    without a files.get. Returns the number of folders added.
+    """
+    added = 0
+    for item in items:
+        item_id = item.get("id")
+        if item.get("mimeType") == config.FOLDER_MIME_TYPE and item_id not in item_cache:
+            item_cache[item_id] = {key: item.get(key) for key in ("id", "name", "parents", "mimeType")}
+            added += 1
+    return added
+
+def _drop_page_cache(fh: BinaryIO):
+    """
+    Asks the kernel to write back and drop a just-downloaded file from the page cache, so write-once
+    backup data does not evict hot pages. No-op where posix_fadvise is unavailable (macOS, Windows).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fh.flush()
+        os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError as e:
+        log.debug("posix_fadvise failed for %s: %s", fh.name, e)
+
+def local_file_path(mime_type: str, local_path_base: Path) -> Path:
+    """Final path download_file writes an item to: Google Workspace files get their export extension."""
+    export_info = config.GOOGLE_MIME_TYPES_EXPORT.get(mime_type)
+    return local_path_base.with_suffix(export_info["extension"]) if export_info else local_path_base
+
 def download_file(
     service: Resource,
     item: Dict[str, Any],
     local_path_base: Path, # Base path (directory + sanitized name, NO extension yet)
     gspread_client: Optional[gspread.Client] = None,
-    retry_count: int = 0
+    retry_count: int = 0,
+    throttle_retries: int = 0
 ) -> Tuple[bool, Path]:
-    """Downloads or exports a file. Returns success flag and the final path (including extension)."""
+    """
+    Downloads or exports a file. Returns success flag and the final path (including extension).
+    Throttled downloads (429, 5xx, 403 rate limits) are retried up to MAX_THROTTLE_RETRIES times, honoring Retry-After.
+    """
     item_id = item["id"]
     item_name = item.get("name", "_unnamed_")
     mime_type = item.get("mimeType", "")
@@ -163,21 +357,21 @@ def download_file(
         return False, local_path_base
 
     request = None
-    is_google_doc = False
     final_local_path = local_path_base # Start with the base path
 
     # Determine download/export request and final local path with extension
     # Check if this is a Google Docs file by MIME type ONLY (not by file extension)
+    # Resolved once up front; reused by every branch below
+    export_info = config.GOOGLE_MIME_TYPES_EXPORT.get(mime_type)
+    is_google_doc = export_info is not None
     file_extension = Path(item_name).suffix.lower()
     
     # LOG MIME TYPE FOR ANALYSIS (only for problematic extensions with suspicious MIME types)
-    if file_extension in [".docx", ".xlsx", ".pptx"] and mime_type in config.GOOGLE_MIME_TYPES_EXPORT:
+    if is_google_doc and file_extension in (".docx", ".xlsx", ".pptx"):
         log.warning("%s: SUSPICIOUS: MS Office extension '%s' but Google MIME '%s'", 
                     log_prefix, file_extension, mime_type)
     
-    if mime_type in config.GOOGLE_MIME_TYPES_EXPORT:
-        is_google_doc = True
-        export_info = config.GOOGLE_MIME_TYPES_EXPORT[mime_type]
+    if is_google_doc:
         export_mime_type = export_info["mimeType"]
         # Append the correct extension for Google Docs export
         final_local_path = local_path_base.with_suffix(export_info["extension"])
@@ -222,26 +416,33 @@ def download_file(
     # --- Download Block --- Ensure parent directory exists --- #
     download_success = False
     try:
-        # Ensure the PARENT directory for the file exists
+        # Ensure the PARENT directory for the file exists. reconstruct_and_create_path has almost always
+        # created it already, so it is only looked at when opening the file fails (no stat per file)
         parent_dir = final_local_path.parent
-        if not parent_dir.exists():
+        try:
+            fh = open(final_local_path, "wb")
+        except FileNotFoundError:
             log.debug("%s: Creating parent directory: %s", log_prefix, parent_dir)
             parent_dir.mkdir(parents=True, exist_ok=True)
-        elif not parent_dir.is_dir():
+            fh = open(final_local_path, "wb")
+        except NotADirectoryError:
              log.error("%s: Parent path %s is not a directory! Cannot download file.", log_prefix, parent_dir)
              driveup_logger.log_file_status(str(final_local_path), "failed", "Parent path is not a directory")
              return False, final_local_path
 
         # Proceed with download/export
-        with open(final_local_path, "wb") as fh:
+        with fh:
             # Get file size for progress bar, if available (not usually for exports)
             file_size = item.get("size")
-            # Only show tqdm progress bar for large files to reduce log spam
+            # Only show tqdm progress bar for large files to reduce log spam,
+            # and never for headless runs (no TTY) where the bar is pure overhead
             file_size_int = int(file_size) if file_size else 0
-            use_tqdm = file_size is not None and not is_google_doc and file_size_int > 1024 * 1024  # Only for files > 1MB
+            use_tqdm = (file_size is not None and not is_google_doc and file_size_int > 1024 * 1024  # Only for files > 1MB
+                        and sys.stderr.isatty())
             pbar = tqdm.tqdm(
                 total=file_size_int if use_tqdm else None,
-                unit="B", unit_scale=True, desc=f"Downloading {final_local_path.name}", leave=False, disable=not use_tqdm
+                unit="B", unit_scale=True, desc=f"Downloading {final_local_path.name}", leave=False, disable=not use_tqdm,
+                miniters=max(1, file_size_int // 200), mininterval=0.5  # Let tqdm coalesce redraws
             )
             downloader = MediaIoBaseDownload(fh, request, chunksize=1024 * 1024 * 10) # 10MB chunks
             done = False
@@ -250,8 +451,10 @@ def download_file(
                 try:
                     status, done = downloader.next_chunk(num_retries=3)
                     if use_tqdm and status:
-                        # Update progress based on resumable_progress
-                        pbar.update(status.resumable_progress - pbar.n)
+                        # Update progress based on resumable_progress, batched to >= 4MB steps
+                        progress_delta = status.resumable_progress - pbar.n
+                        if progress_delta >= PBAR_MIN_UPDATE_BYTES or (done and progress_delta > 0):
+                            pbar.update(progress_delta)
                 except HttpError as download_err:
                     # Handle specific errors that can occur during download/export
                     if download_err.resp.status == 403 and "fileNotExportable" in str(download_err):
@@ -273,13 +476,22 @@ def download_file(
                         # Rethrow or handle specific statuses if needed
                         raise download_err # Reraise to be caught by the outer try block
             pbar.close()
+            if config.DROP_DOWNLOAD_PAGE_CACHE:
+                _drop_page_cache(fh)
         # File successfully processed (no log to reduce noise)
         driveup_logger.log_file_status(str(final_local_path), "downloaded")
         download_success = True
 
     except HttpError as error:
         # Handle specific API errors
-        if error.resp.status == 403 and "exportSizeLimitExceeded" in str(error):
+        if throttle_retries < MAX_THROTTLE_RETRIES and _is_throttled(error):
+            wait_time = _throttle_wait(error, throttle_retries)
+            log.warning("%s: Drive returned %d. Retrying in %.1fs (%d/%d)...",
+                        log_prefix, error.resp.status, wait_time, throttle_retries + 1, MAX_THROTTLE_RETRIES)
+            rate_limiter.get_rate_limiter().report_throttle(wait_time)
+            time.sleep(wait_time)
+            return download_file(service, item, local_path_base, gspread_client, retry_count, throttle_retries + 1)
+        elif error.resp.status == 403 and "exportSizeLimitExceeded" in str(error):
             log.warning("%s: File too large for export (exportSizeLimitExceeded). Skipping.", log_prefix)
             driveup_logger.log_file_status(str(final_local_path), "skipped", "File too large for export")
             return False, final_local_path
@@ -339,7 +551,7 @@ def download_file(
         driveup_logger.log_file_status(str(final_local_path), "failed", f"I/O error: {e}")
         return False, final_local_path
     except Exception as e:
-        log.error("%s: Unknown error during download to %s: %s", log_prefix, final_local_path, e, exc_info=True)
+        log.error("%s: Unknown error during download to %s: %s", log_prefix, final_local_path, e, exc_info=utils.sample_traceback())
         # Clean up potentially partial file
         if final_local_path.exists():
             try: final_local_path.unlink(missing_ok=True)
@@ -360,13 +572,15 @@ def download_file(
                 # Add delay to avoid hitting Sheets API quota limits
                 time.sleep(config.SHEETS_API_DELAY_SECONDS)
                 log.warning("%s: HEARTBEAT: Processing sheet %d/%d - '%s'", log_prefix, sheet_idx, total_sheets, worksheet.title)
-                worksheet_safe_name = utils.sanitize_filename(worksheet.title)
+                worksheet_safe_name = _sanitize(worksheet.title)
                 # Create CSV paths relative to the downloaded .xlsx file
                 csv_formulas_path = final_local_path.parent / f"{final_local_path.stem}.{worksheet_safe_name}.formulas.csv"
                 try:
-                    # Fetch both formulas and formatted values
+                    # Fetch formulas first; formatted values are only needed (and fetched) when formulas exist
                     formulas = worksheet.get_all_values(value_render_option=ValueRenderOption.formula)
-                    formatted_values = worksheet.get_all_values(value_render_option=ValueRenderOption.formatted)
+                    formatted_values = []
+                    if sheet_has_formulas(formulas):
+                        formatted_values = worksheet.get_all_values(value_render_option=ValueRenderOption.formatted)
                 except Exception as sheet_error:
                      log.error("%s: Failed to get data for sheet '%s': %s", log_prefix, worksheet.title, sheet_error)
                      driveup_logger.log_file_status(str(csv_formulas_path), "failed", f"Failed to get sheet data: {sheet_error}")
@@ -396,12 +610,10 @@ def download_file(
 
                     # Create the CSV file only if formulas are present
                     if has_formulas:
-                        with open(csv_formulas_path, "w", encoding="utf-8", newline="") as f_csv:
-                            # Write header
-                            f_csv.write("Cell,Formula,FormattedValue\n")
-                            # Write all collected formula cells
-                            for coord, formula, value in formula_cells:
-                                f_csv.write(f'{coord},"{formula}","{value}"\n')
+                        # Build the whole CSV in memory (header + all collected formula cells) and write it in one go
+                        csv_lines = ["Cell,Formula,FormattedValue\n"]
+                        csv_lines.extend(f'{coord},"{formula}","{value}"\n' for coord, formula, value in formula_cells)
+                        csv_formulas_path.write_bytes("".join(csv_lines).encode("utf-8"))
 
                         log.info("%s: Sheet '%s' formulas saved to %s", log_prefix, worksheet.title, csv_formulas_path)
                         driveup_logger.log_file_status(str(csv_formulas_path), "downloaded")
@@ -420,7 +632,7 @@ def download_file(
                     log.error("%s: Error writing formula CSV file %s: %s", log_prefix, csv_formulas_path, io_err)
                     driveup_logger.log_file_status(str(csv_formulas_path), "failed", f"I/O error: {io_err}")
                 except Exception as e:
-                    log.error("%s: Unknown error writing formulas CSV for sheet '%s': %s", log_prefix, worksheet.title, e, exc_info=True)
+                    log.error("%s: Unknown error writing formulas CSV for sheet '%s': %s", log_prefix, worksheet.title, e, exc_info=utils.sample_traceback())
                     driveup_logger.log_file_status(str(csv_formulas_path), "failed", f"Unknown error: {e}")
 
         except HttpError as sheet_error:
@@ -435,7 +647,7 @@ def download_file(
             log.error("%s: gspread API error for sheet '%s': %s", log_prefix, item_name, gspread_error)
             driveup_logger.log_file_status(str(final_local_path), "failed", f"gspread API error: {gspread_error}")
         except Exception as e:
-            log.error("%s: Unknown error processing sheet '%s': %s", log_prefix, item_name, e, exc_info=True)
+            log.error("%s: Unknown error processing sheet '%s': %s", log_prefix, item_name, e, exc_info=utils.sample_traceback())
             driveup_logger.log_file_status(str(final_local_path), "failed", f"Unknown error processing sheet: {e}")
         else:
             # Success - log completion heartbeat
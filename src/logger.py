@@ -1,56 +1,172 @@
+import atexit
+import heapq
+import itertools
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import tempfile
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Set, Dict, Any
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Statuses tracked for the end-of-run summary
+FILE_STATUSES = ("downloaded", "skipped", "failed")
 
 class FileListHandler(logging.Handler):
-    def __init__(self):
+    """
+    Collects per-file statuses for the summary without keeping them all in RAM.
+    Entries are buffered per status and spilled to sorted JSONL shards on disk;
+    the summary is produced by a heapq.merge over the shards.
+    """
+    def __init__(self, shard_size: int = 10000):
         super().__init__()
-        self.downloaded_files: Set[str] = set()
-        self.skipped_files: Set[str] = set()
-        self.failed_files: Dict[str, str] = {}  # file_path: error_message
+        self.shard_size = shard_size
+        self.shard_dir: Optional[Path] = None
+        self._buffers: Dict[str, List[Tuple[str, int, str]]] = {status: [] for status in FILE_STATUSES}
+        self._shards: Dict[str, List[Path]] = {status: [] for status in FILE_STATUSES}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
 
     def emit(self, record):
         pass
 
+    def add(self, status: str, file_path: str, error_msg: str = ""):
+        with self._lock:
+            buffer = self._buffers[status]
+            buffer.append((file_path, next(self._seq), error_msg))
+            if len(buffer) >= self.shard_size:
+                self._flush(status)
+
+    def _flush(self, status: str):
+        """Sorts the in-memory buffer for status and writes it out as a new shard. Caller holds the lock."""
+        buffer = self._buffers[status]
+        if not buffer:
+            return
+        if self.shard_dir is None:
+            self.shard_dir = Path(tempfile.mkdtemp(prefix="driveup_summary_"))
+        buffer.sort()
+        shard_path = self.shard_dir / f"{status}.{len(self._shards[status])}.jsonl"
+        with open(shard_path, "w", encoding="utf-8") as f:
+            for entry in buffer:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._shards[status].append(shard_path)
+        self._buffers[status] = []
+
+    def has_entries(self, status: str) -> bool:
+        return bool(self._buffers[status] or self._shards[status])
+
+    @staticmethod
+    def _read_shard(shard_path: Path) -> Iterator[Tuple[str, int, str]]:
+        with open(shard_path, "r", encoding="utf-8") as f:
+            for line in f:
+                file_path, seq, error_msg = json.loads(line)
+                yield file_path, seq, error_msg
+
+    def iter_sorted(self, status: str) -> Iterator[Tuple[str, str]]:
+        """
+        Yields (file_path, error_msg) in path order, one entry per path.
+        When a path was reported several times, the latest report wins.
+        """
+        with self._lock:
+            self._flush(status)
+            shards = list(self._shards[status])
+
+        merged = heapq.merge(*(self._read_shard(shard) for shard in shards))
+        pending: Optional[Tuple[str, int, str]] = None
+        for entry in merged:
+            if pending is not None and entry[0] != pending[0]:
+                yield pending[0], pending[2]
+            pending = entry
+        if pending is not None:
+            yield pending[0], pending[2]
+
+    def cleanup(self):
+        """Removes the on-disk shards."""
+        with self._lock:
+            if self.shard_dir is not None:
+                shutil.rmtree(self.shard_dir, ignore_errors=True)
+            self.shard_dir = None
+            self._buffers = {status: [] for status in FILE_STATUSES}
+            self._shards = {status: [] for status in FILE_STATUSES}
+
 class DriveupLogger:
     def __init__(self):
         self.file_handler = None
         self.file_list_handler = FileListHandler()
         self.log_file_path = None
+        self._queue = None
+        self._queue_handler = None
+        self._listener = None
+        self._console_handlers: List[logging.Handler] = []
 
     def setup(self, log_level: str = "INFO"):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         log_dir = Path("/app/driveup_logs")
         log_dir.mkdir(parents=True, exist_ok=True)
-        
+
         self.log_file_path = log_dir / f"driveup_{timestamp}.log"
-        
+
         # Create file handler
         self.file_handler = logging.FileHandler(self.log_file_path)
         self.file_handler.setFormatter(
             logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         )
 
-        # Configure root logger
+        # Route records through a queue so worker threads never block on file I/O;
+        # a single listener thread drains the queue into the real handlers.
+        # Console handlers already on the root logger (coloredlogs) move behind the queue too.
         root_logger = logging.getLogger()
+        self._console_handlers = list(root_logger.handlers)
+        for handler in self._console_handlers:
+            root_logger.removeHandler(handler)
+
+        self._queue = queue.Queue(-1)
+        self._queue_handler = logging.handlers.QueueHandler(self._queue)
+        self._listener = logging.handlers.QueueListener(
+            self._queue, self.file_handler, self.file_list_handler, *self._console_handlers,
+            respect_handler_level=True
+        )
+        self._listener.start()
+        atexit.register(self.shutdown)
+
+        # Configure root logger
         root_logger.setLevel(getattr(logging, log_level.upper()))
-        root_logger.addHandler(self.file_handler)
-        root_logger.addHandler(self.file_list_handler)
+        root_logger.addHandler(self._queue_handler)
+
+    def shutdown(self):
+        """Flushes queued log records to the log file and stops the listener thread. Safe to call twice."""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+        root_logger = logging.getLogger()
+        root_logger.removeHandler(self._queue_handler)
+        self._queue_handler = None
+        # Anything logged after shutdown goes straight to the console again
+        for handler in self._console_handlers:
+            root_logger.addHandler(handler)
+        self._console_handlers = []
+        self.file_handler.close()
 
     def log_file_status(self, file_path: str, status: str, error_msg: str = None):
         if status == "downloaded":
-            self.file_list_handler.downloaded_files.add(file_path)
+            self.file_list_handler.add("downloaded", file_path)
         elif status == "skipped":
-            self.file_list_handler.skipped_files.add(file_path)
+            self.file_list_handler.add("skipped", file_path)
         elif status == "failed":
-            self.file_list_handler.failed_files[file_path] = error_msg or "Unknown error"
+            self.file_list_handler.add("failed", file_path, error_msg or "Unknown error")
 
     def write_summary(self):
+        # Drain pending records first so the summary is the last thing in the file
+        self.shutdown()
         if not self.log_file_path or not self.log_file_path.exists():
             return
 
+        handler = self.file_list_handler
         with open(self.log_file_path, "a") as f:
             f.write("\n\n" + "="*80 + "\n")
             f.write("BACKUP SUMMARY\n")
@@ -58,22 +174,24 @@ class DriveupLogger:
 
             f.write("DOWNLOADED FILES:\n")
             f.write("-"*80 + "\n")
-            for file in sorted(self.file_list_handler.downloaded_files):
+            for file, _ in handler.iter_sorted("downloaded"):
                 f.write(f"✓ {file}\n")
 
-            if self.file_list_handler.skipped_files:
+            if handler.has_entries("skipped"):
                 f.write("\nSKIPPED FILES:\n")
                 f.write("-"*80 + "\n")
-                for file in sorted(self.file_list_handler.skipped_files):
+                for file, _ in handler.iter_sorted("skipped"):
                     f.write(f"⚠ {file}\n")
 
-            if self.file_list_handler.failed_files:
+            if handler.has_entries("failed"):
                 f.write("\nFAILED FILES:\n")
                 f.write("-"*80 + "\n")
-                for file_path, error in sorted(self.file_list_handler.failed_files.items()):
+                for file_path, error in handler.iter_sorted("failed"):
                     f.write(f"✗ {file_path}\n")
                     f.write(f"  Error: {error}\n")
 
             f.write("\n" + "="*80 + "\n")
 
-driveup_logger = DriveupLogger() 
\ No newline at end of file
+        handler.cleanup()
+
+driveup_logger = DriveupLogger()
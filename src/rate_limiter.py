@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import itertools
 import logging
 import threading
 import time
@@ -14,6 +15,8 @@ class AdaptiveRateLimiter:
     
     Features:
     - Throttles concurrent API calls using a semaphore
+    - Paces call starts with a shared token bucket that refills at max_concurrent_calls tokens per adaptive_delay,
+      so each of the N concurrent callers gets one call per adaptive_delay (bursts up to max_concurrent_calls)
     - Automatically backs off when SSL errors are detected
     - Adapts rate limits based on error frequency
     """
@@ -28,21 +31,32 @@ class AdaptiveRateLimiter:
         """
         self.semaphore = threading.Semaphore(max_concurrent_calls)
         self.min_delay = min_delay
-        self.last_call_time = {}  # Track last call time per thread
-        self.lock = threading.Lock()
+        self.cond = threading.Condition()  # Guards adaptive state; paced threads wait on it
+        self._waiting = 0  # Number of threads currently waiting on cond
+        
+        # Token bucket: refills at capacity tokens per adaptive_delay; idle time banks up to capacity tokens for bursts
+        self._bucket_lock = threading.Lock()
+        self._capacity = float(max_concurrent_calls)
+        self._tokens = self._capacity
+        self._refill_time = time.monotonic()
         
         # Adaptive throttling
         self.ssl_error_count = 0
         self.total_calls = 0
+        self._call_counter = itertools.count(1)
         self.adaptive_delay = min_delay
         self.last_ssl_error_time = 0
         
+        # Time spent waiting out 429/5xx responses (see report_throttle)
+        self.throttle_waits = 0
+        self.throttle_wait_seconds = 0.0
+        
         # Configuration
         self.ssl_error_threshold = 10  # Increase delay after N SSL errors (was 3, too aggressive)
         self.max_adaptive_delay = 10.0  # Maximum adaptive delay (seconds)
         self.recovery_time = 120  # Time to reduce delay if no errors (seconds)
         
-        log.info(f"🔧 AdaptiveRateLimiter initialized: max_concurrent={max_concurrent_calls}, min_delay={min_delay}s")
+        log.info("🔧 AdaptiveRateLimiter initialized: max_concurrent=%d, min_delay=%ss", max_concurrent_calls, min_delay)
     
     def acquire(self, timeout: Optional[float] = None) -> bool:
         """
@@ -59,48 +73,68 @@ class AdaptiveRateLimiter:
         if not acquired:
             return False
         
-        # Apply adaptive delay
-        thread_id = threading.current_thread().ident
+        now = time.monotonic()
+        # next() on itertools.count is atomic under the GIL, so counting needs no lock
+        self.total_calls = next(self._call_counter)
         
-        with self.lock:
-            self.total_calls += 1
-            
-            # Check if we should reduce delay (recovery)
-            if self.ssl_error_count > 0 and (time.time() - self.last_ssl_error_time) > self.recovery_time:
-                old_delay = self.adaptive_delay
-                self.adaptive_delay = max(self.min_delay, self.adaptive_delay * 0.8)
-                self.ssl_error_count = max(0, self.ssl_error_count - 1)
-                log.info(f"📉 Reducing adaptive delay: {old_delay:.2f}s → {self.adaptive_delay:.2f}s (recovery)")
-            
-            # Get last call time for this thread
-            last_time = self.last_call_time.get(thread_id, 0)
-            current_time = time.time()
-            
-            # Calculate required delay
-            elapsed = current_time - last_time
-            required_delay = self.adaptive_delay
-            
-            if elapsed < required_delay:
-                sleep_time = required_delay - elapsed
-                self.last_call_time[thread_id] = current_time + sleep_time
-            else:
-                self.last_call_time[thread_id] = current_time
+        # Recovery only matters once SSL errors were seen and the quiet period has elapsed:
+        # a single unlocked read of the counter keeps the steady state (zero errors) branch-only
+        ssl_count = self.ssl_error_count
+        if ssl_count and (now - self.last_ssl_error_time) > self.recovery_time:
+            with self.cond:
+                # Check if we should reduce delay (recovery) - re-checked under the lock
+                if self.ssl_error_count > 0 and (now - self.last_ssl_error_time) > self.recovery_time:
+                    old_delay = self.adaptive_delay
+                    self.adaptive_delay = max(self.min_delay, self.adaptive_delay * 0.8)
+                    self.ssl_error_count = max(0, self.ssl_error_count - 1)
+                    log.info("📉 Reducing adaptive delay: %.2fs → %.2fs (recovery)", old_delay, self.adaptive_delay)
+                    # Shorter delay: let paced threads re-evaluate their deadline
+                    self.cond.notify_all()
         
-        # Sleep outside the lock to avoid blocking other threads
-        if elapsed < required_delay:
-            time.sleep(sleep_time)
+        # Apply adaptive delay: wait for a token from the shared bucket
+        wait_time = self._take_token()
+        if wait_time > 0:
+            # Wait on the condition rather than sleeping blindly: release() and delay changes
+            # wake waiters, which retry as soon as a token may be available
+            with self.cond:
+                self._waiting += 1
+                try:
+                    while wait_time > 0:
+                        self.cond.wait(timeout=wait_time)
+                        wait_time = self._take_token()
+                finally:
+                    self._waiting -= 1
         
         return True
     
+    def _take_token(self) -> float:
+        """Takes a token from the bucket. Returns 0 on success, otherwise the time until one is due."""
+        with self._bucket_lock:
+            delay = self.adaptive_delay
+            if delay <= 0:
+                return 0.0
+            now = time.monotonic()
+            # Rate scales with concurrency: one call per adaptive_delay for each concurrent slot
+            interval = delay / self._capacity
+            self._tokens = min(self._capacity, self._tokens + (now - self._refill_time) / interval)
+            self._refill_time = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * interval
+    
     def release(self):
-        """Release the semaphore after API call completes."""
+        """Release the semaphore after API call completes and wake one paced waiter."""
         self.semaphore.release()
+        if self._waiting:
+            with self.cond:
+                self.cond.notify()
     
     def report_ssl_error(self):
         """Report an SSL error to trigger adaptive throttling."""
-        with self.lock:
+        with self.cond:
             self.ssl_error_count += 1
-            self.last_ssl_error_time = time.time()
+            self.last_ssl_error_time = time.monotonic()
             
             # Increase delay if error threshold exceeded
             if self.ssl_error_count >= self.ssl_error_threshold:
@@ -109,11 +143,17 @@ class AdaptiveRateLimiter:
                 
                 if old_delay != self.adaptive_delay:
                     log.warning(
-                        f"🔥 SSL error threshold reached ({self.ssl_error_count} errors)! "
-                        f"Increasing delay: {old_delay:.2f}s → {self.adaptive_delay:.2f}s"
+                        "🔥 SSL error threshold reached (%d errors)! Increasing delay: %.2fs → %.2fs",
+                        self.ssl_error_count, old_delay, self.adaptive_delay
                     )
             else:
-                log.debug(f"SSL error reported ({self.ssl_error_count}/{self.ssl_error_threshold})")
+                log.debug("SSL error reported (%d/%d)", self.ssl_error_count, self.ssl_error_threshold)
+    
+    def report_throttle(self, wait_time: float):
+        """Records a wait of wait_time seconds before retrying a throttled (429) or failed (5xx) call."""
+        with self.cond:
+            self.throttle_waits += 1
+            self.throttle_wait_seconds += wait_time
     
     def report_success(self):
         """Report a successful API call."""
@@ -121,14 +161,21 @@ class AdaptiveRateLimiter:
         pass
     
     def get_stats(self) -> dict:
-        """Get current statistics."""
-        with self.lock:
-            return {
-                'total_calls': self.total_calls,
-                'ssl_errors': self.ssl_error_count,
-                'current_delay': self.adaptive_delay,
-                'error_rate': self.ssl_error_count / max(1, self.total_calls) * 100
-            }
+        """
+        Get current statistics.
+        Lock-free snapshot: each field is read once, so the values may be off by a call or two
+        relative to each other, but polling never contends with acquire().
+        """
+        total_calls = self.total_calls
+        ssl_errors = self.ssl_error_count
+        return {
+            'total_calls': total_calls,
+            'ssl_errors': ssl_errors,
+            'current_delay': self.adaptive_delay,
+            'error_rate': ssl_errors / max(1, total_calls) * 100,
+            'throttle_waits': self.throttle_waits,
+            'throttle_wait_seconds': self.throttle_wait_seconds
+        }
     
     def __enter__(self):
         """Context manager support."""
@@ -180,6 +227,6 @@ def init_rate_limiter(max_workers: int = 1, min_delay: float = 0.2):
         min_delay=min_delay
     )
     
-    log.info(f"🚀 Rate limiter initialized for {max_workers} workers")
+    log.info("🚀 Rate limiter initialized for %d workers", max_workers)
     return _global_rate_limiter
 
@@ -1,25 +1,62 @@
 # -*- coding: utf-8 -*-
 
 import logging
-from typing import Optional, Any
+import threading
+from typing import Dict, Optional, Any, Tuple
 
 from . import config
 
-# Try importing Boto3 for S3
+# Boto3 availability and its exceptions (real or dummy placeholders) are resolved once in config
+from .config import NoCredentialsError, PartialCredentialsError, ClientError
+
 if config.BOTO3_AVAILABLE:
     import boto3
-    from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
-else:
-    # Define dummy exceptions if Boto3 not available, for cleaner except blocks later
-    NoCredentialsError = type('NoCredentialsError', (Exception,), {})
-    PartialCredentialsError = type('PartialCredentialsError', (Exception,), {})
-    ClientError = type('ClientError', (Exception,), {})
+    from boto3.s3.transfer import TransferConfig
 
 log = logging.getLogger(__name__)
 
+# Clients are cached per connection settings so repeated callers share one client and its connection pool
+_client_cache: Dict[Tuple[Optional[str], ...], Any] = {}
+_client_cache_lock = threading.Lock()
+
+def _build_s3_client(s3_endpoint_url: Optional[str], s3_region: Optional[str], s3_access_key: Optional[str], s3_secret_key: Optional[str]) -> Any:
+    """Builds a tuned boto3 S3 client."""
+    s3_client_kwargs = {}
+    
+    if s3_endpoint_url:
+        s3_client_kwargs['endpoint_url'] = s3_endpoint_url
+        
+    if s3_region:
+        s3_client_kwargs['region_name'] = s3_region
+        
+    if s3_access_key and s3_secret_key:
+        s3_client_kwargs['aws_access_key_id'] = s3_access_key
+        s3_client_kwargs['aws_secret_access_key'] = s3_secret_key
+    
+    config_kwargs = {}
+    if s3_endpoint_url:
+        # S3-compatible endpoints: only compute/validate body checksums when the operation requires it,
+        # instead of an extra CRC/SHA pass over every uploaded part (requests stay SigV4-signed)
+        config_kwargs['request_checksum_calculation'] = 'when_required'
+        config_kwargs['response_checksum_validation'] = 'when_required'
+    
+    s3_client_kwargs['config'] = boto3.session.Config(
+        signature_version='s3v4',
+        max_pool_connections=50,  # Default of 10 is below what parallel part uploads need
+        tcp_keepalive=True,
+        s3={
+            'addressing_style': 'auto',
+            'payload_signing_enabled': False
+        },
+        **config_kwargs
+    )
+        
+    return boto3.client('s3', **s3_client_kwargs)
+
 def setup_s3_client(s3_bucket: Optional[str], s3_endpoint_url: Optional[str] = None, s3_region: Optional[str] = None, s3_access_key: Optional[str] = None, s3_secret_key: Optional[str] = None) -> tuple[Optional[Any], bool]:
     """
     Initialize S3 client if bucket is specified.
+    The client is cached, so repeated calls with the same settings return the same instance.
     Returns (s3_client, s3_enabled).
     """
     if not s3_bucket:
@@ -29,132 +66,50 @@ def setup_s3_client(s3_bucket: Optional[str], s3_endpoint_url: Optional[str] = N
         log.error("S3 upload requested but boto3 is not installed. Please install it with: pip install boto3")
         return None, False
         
+    cache_key = (s3_endpoint_url, s3_region, s3_access_key, s3_secret_key)
     try:
-        s3_client_kwargs = {}
-        
-        if s3_endpoint_url:
-            s3_client_kwargs['endpoint_url'] = s3_endpoint_url
-            
-        if s3_region:
-            s3_client_kwargs['region_name'] = s3_region
-            
-        if s3_access_key and s3_secret_key:
-            s3_client_kwargs['aws_access_key_id'] = s3_access_key
-            s3_client_kwargs['aws_secret_access_key'] = s3_secret_key
-        
-        s3_client_kwargs['config'] = boto3.session.Config(
-            signature_version='s3v4',
-            s3={
-                'addressing_style': 'auto',
-                'payload_signing_enabled': False
-            }
-        )
-            
-        s3_client = boto3.client('s3', **s3_client_kwargs)
-        log.info(f"S3 client initialized for bucket: {s3_bucket}")
+        with _client_cache_lock:
+            s3_client = _client_cache.get(cache_key)
+            if s3_client is None:
+                s3_client = _build_s3_client(s3_endpoint_url, s3_region, s3_access_key, s3_secret_key)
+                _client_cache[cache_key] = s3_client
+                log.info("S3 client initialized for bucket: %s", s3_bucket)
         return s3_client, True
     except Exception as e:
-        log.error(f"Failed to initialize S3 client: {e}")
+        log.error("Failed to initialize S3 client: %s", e)
         return None, False
 
-def upload_archive_to_s3(archive_path: str, s3_client: Any, s3_bucket: str, s3_prefix: Optional[str], archive_name: str) -> bool:
+def upload_archive_to_s3(archive_path: str, s3_client: Any, s3_bucket: str, s3_prefix: Optional[str], archive_name: str, max_concurrency: Optional[int] = None) -> bool:
     """
-    Uploads the specified archive file to S3 using multipart upload for large files.
+    Uploads the specified archive file to S3 using boto3's managed transfer.
+    The file is streamed from disk; large files are sent as a multipart upload whose parts
+    are uploaded by up to max_concurrency threads sharing the one client (default: config.S3_UPLOAD_CONCURRENCY).
     Returns True on success, False on failure.
     """
-    import os
     from pathlib import Path
     
     try:
         s3_key = f"{s3_prefix.rstrip('/')}/{archive_name}" if s3_prefix else archive_name
         file_size = Path(archive_path).stat().st_size
-        log.info(f"Uploading archive to s3://{s3_bucket}/{s3_key} (size: {file_size / (1024*1024*1024):.2f} GB)")
+        log.info("Uploading archive to s3://%s/%s (size: %.2f GB)", s3_bucket, s3_key, file_size / (1024*1024*1024))
         
-        # Use multipart upload for files larger than 100MB
-        if file_size > 100 * 1024 * 1024:  # 100MB threshold
-            log.info("Using multipart upload for large file")
-            return _multipart_upload(s3_client, archive_path, s3_bucket, s3_key, file_size)
-        else:
-            log.info("Using simple upload for small file")
-            return _simple_upload(s3_client, archive_path, s3_bucket, s3_key)
+        transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,   # Multipart above 8MB
+            multipart_chunksize=16 * 1024 * 1024,  # 16MB parts (boto3 grows this if >10000 parts are needed)
+            max_concurrency=max_concurrency or config.S3_UPLOAD_CONCURRENCY,
+            io_chunksize=1024 * 1024,              # Read the archive in 1MB blocks (default 256KB)
+            use_threads=True
+        )
+        s3_client.upload_file(archive_path, s3_bucket, s3_key, Config=transfer_config)
+        log.info("Archive uploaded to S3 successfully")
+        return True
             
     except (NoCredentialsError, PartialCredentialsError) as e:
-        log.error(f"AWS credentials not found for S3 archive upload: {e}")
+        log.error("AWS credentials not found for S3 archive upload: %s", e)
         return False
     except ClientError as e:
-        log.error(f"AWS S3 client error uploading archive to s3://{s3_bucket}/{s3_key}: {e}")
+        log.error("AWS S3 client error uploading archive to s3://%s/%s: %s", s3_bucket, s3_key, e)
         return False
     except Exception as e:
-        log.error(f"Unknown error during S3 archive upload to s3://{s3_bucket}/{s3_key}: {e}", exc_info=True)
+        log.error("Unknown error during S3 archive upload to s3://%s/%s: %s", s3_bucket, s3_key, e, exc_info=True)
         return False
-
-def _simple_upload(s3_client: Any, archive_path: str, s3_bucket: str, s3_key: str) -> bool:
-    """Simple upload for small files"""
-    with open(archive_path, 'rb') as f:
-        s3_client.put_object(
-            Bucket=s3_bucket,
-            Key=s3_key,
-            Body=f.read()
-        )
-    log.info("Archive uploaded to S3 successfully (simple upload)")
-    return True
-
-def _multipart_upload(s3_client: Any, archive_path: str, s3_bucket: str, s3_key: str, file_size: int) -> bool:
-    """Multipart upload for large files"""
-    chunk_size = 100 * 1024 * 1024  # 100MB chunks
-    
-    # Start multipart upload
-    response = s3_client.create_multipart_upload(Bucket=s3_bucket, Key=s3_key)
-    upload_id = response['UploadId']
-    log.info(f"Started multipart upload with ID: {upload_id}")
-    
-    parts = []
-    part_number = 1
-    
-    try:
-        with open(archive_path, 'rb') as f:
-            while True:
-                chunk = f.read(chunk_size)
-                if not chunk:
-                    break
-                
-                # Upload part
-                log.info(f"Uploading part {part_number} ({len(chunk) / (1024*1024):.1f} MB)")
-                response = s3_client.upload_part(
-                    Bucket=s3_bucket,
-                    Key=s3_key,
-                    PartNumber=part_number,
-                    UploadId=upload_id,
-                    Body=chunk
-                )
-                
-                parts.append({
-                    'ETag': response['ETag'],
-                    'PartNumber': part_number
-                })
-                part_number += 1
-        
-        # Complete multipart upload
-        s3_client.complete_multipart_upload(
-            Bucket=s3_bucket,
-            Key=s3_key,
-            UploadId=upload_id,
-            MultipartUpload={'Parts': parts}
-        )
-        
-        log.info(f"Archive uploaded to S3 successfully (multipart upload, {len(parts)} parts)")
-        return True
-        
-    except Exception as e:
-        # Abort multipart upload on error
-        log.error(f"Multipart upload failed, aborting: {e}")
-        try:
-            s3_client.abort_multipart_upload(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                UploadId=upload_id
-            )
-            log.info("Multipart upload aborted")
-        except Exception as abort_e:
-            log.error(f"Failed to abort multipart upload: {abort_e}")
-        raise 
\ No newline at end of file
@@ -2,36 +2,247 @@
 
 import json
 import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
 from pathlib import Path
-from typing import Dict, Optional, Any
+from typing import Dict, Iterator, NamedTuple, Optional, Any, Tuple
 
 from googleapiclient.discovery import Resource
 from googleapiclient.errors import HttpError
 
-# Import config constants if needed (e.g., for logging)
-# from . import config
+from . import config
+from . import rate_limiter
+
+# orjson is optional: much faster (de)serialization of JSON state data, stdlib json otherwise
+if config.ORJSON_AVAILABLE:
+    import orjson
 
 log = logging.getLogger(__name__)
 
+def _json_loads(raw: bytes) -> Any:
+    """Parses UTF-8 JSON bytes. Raises json.JSONDecodeError (orjson's error subclasses it)."""
+    if config.ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _json_dumps(value: Any) -> str:
+    """Serializes value to a JSON string."""
+    if config.ORJSON_AVAILABLE:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value)
+
+def _load_json_file(path: Path) -> Any:
+    """
+    Parses a JSON file. With orjson the file is memory-mapped and parsed straight from
+    the mapping, avoiding a full read() copy. Raises json.JSONDecodeError on empty/invalid files.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise json.JSONDecodeError("Empty file", "", 0)  # mmap cannot map an empty file
+        if not config.ORJSON_AVAILABLE:
+            return _json_loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return orjson.loads(view)
+            finally:
+                view.release()  # Must be released before the mapping can close
+
 # --- State Management ---
 
-def load_drive_state(state_file: Path) -> Dict[str, Dict[str, Any]]:
+class StateEntry(NamedTuple):
+    """State of one backed-up item: local path relative to the drive backup dir, Drive modifiedTime, folder flag."""
+    path: str
+    modified_time: Optional[str]
+    is_folder: bool
+
+class DriveState(MutableMapping):
     """
-    Loads the state map {fileId: {path, modifiedTime, is_folder}}.
+    State map {fileId: StateEntry} stored in a SQLite database.
+    Behaves like the dict it replaces, but every assignment or deletion is a single-row
+    upsert/delete instead of a rewrite of the whole map, and nothing is loaded up front.
+    Changes accumulate in one transaction until commit() (see save_drive_state).
+    """
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # WAL keeps the database consistent; fsync at checkpoints only
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files (id TEXT PRIMARY KEY, path TEXT NOT NULL, modified TEXT, is_folder INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def __getitem__(self, file_id: str) -> StateEntry:
+        row = self._conn.execute("SELECT path, modified, is_folder FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None:
+            raise KeyError(file_id)
+        return StateEntry(row[0], row[1], bool(row[2]))
+
+    def __setitem__(self, file_id: str, entry: StateEntry):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (id, path, modified, is_folder) VALUES (?, ?, ?, ?)",
+            (file_id, entry.path, entry.modified_time, int(entry.is_folder))
+        )
+
+    def __delitem__(self, file_id: str):
+        if self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,)).rowcount == 0:
+            raise KeyError(file_id)
+
+    def __contains__(self, file_id: object) -> bool:
+        return self._conn.execute("SELECT 1 FROM files WHERE id = ?", (file_id,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        # Materialized so callers may modify the map while iterating
+        return iter([row[0] for row in self._conn.execute("SELECT id FROM files")])
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def clear(self):
+        self._conn.execute("DELETE FROM files")
+        self._conn.execute("DELETE FROM meta")
+
+    def bulk_insert(self, entries: Dict[str, Dict[str, Any]]):
+        """Inserts many legacy JSON entries ({path, modifiedTime, is_folder} dicts) with a single executemany."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (id, path, modified, is_folder) VALUES (?, ?, ?, ?)",
+            ((file_id, entry["path"], entry.get("modifiedTime"), int(bool(entry.get("is_folder"))))
+             for file_id, entry in entries.items())
+        )
+
+    def move_tree(self, old_path: str, new_path: str):
+        """Rewrites the path of every entry below the folder old_path so it sits below new_path instead."""
+        old_prefix = old_path + os.sep
+        self._conn.execute(
+            "UPDATE files SET path = ? || substr(path, ?) WHERE substr(path, 1, ?) = ?",
+            (new_path + os.sep, len(old_prefix) + 1, len(old_prefix), old_prefix)
+        )
+
+    def begin_listing(self):
+        """Starts recording the ids of a full listing in a temporary table (see prune_unlisted)."""
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS listed (id TEXT PRIMARY KEY)")
+        self._conn.execute("DELETE FROM listed")
+
+    def mark_listed(self, file_id: str):
+        self._conn.execute("INSERT OR IGNORE INTO listed (id) VALUES (?)", (file_id,))
+
+    def prune_unlisted(self) -> int:
+        """Deletes the entries not marked since begin_listing() and returns how many were removed."""
+        removed = self._conn.execute("DELETE FROM files WHERE id NOT IN (SELECT id FROM listed)").rowcount
+        self._conn.execute("DROP TABLE listed")
+        return removed
+
+    def set_meta(self, key: str, value: Any):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, _json_dumps(value)))
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        """Commits pending changes and closes the database."""
+        self._conn.commit()
+        self._conn.close()
+
+def _state_db_path(state_file: Path) -> Path:
+    """SQLite database that holds the state map configured as state_file (drive_state.json -> drive_state.db)."""
+    return state_file.with_suffix(".db")
+
+def _delta_log_path(state_file: Path) -> Path:
+    """Path of the change log that accompanied legacy JSON state snapshots."""
+    return state_file.with_name(state_file.name + ".delta.jsonl")
+
+def load_drive_state(state_file: Path) -> DriveState:
+    """
+    Opens the state map {fileId: StateEntry} for state_file.
+    On first use, a legacy JSON state (snapshot plus change log) is imported and removed.
+    """
+    db_path = _state_db_path(state_file)
+    is_new = not db_path.exists()
+    state_map = DriveState(db_path)
+    if is_new and (state_file.exists() or _delta_log_path(state_file).exists()):
+        _migrate_legacy_state(state_map, state_file)
+    entries = len(state_map)
+    if entries:
+        log.info("Drive state map loaded from %s (%d entries)", db_path, entries)
+    else:
+        log.info("Drive state map %s is empty. Full sync required.", db_path)
+    return state_map
+
+def _migrate_legacy_state(state_map: DriveState, state_file: Path):
+    """Imports a JSON state snapshot and its change log into state_map, then deletes the JSON files."""
+    legacy_map = _load_state_snapshot(state_file)
+    replayed = _replay_state_deltas(legacy_map, state_file)
+    try:
+        state_map.bulk_insert(legacy_map)
+        state_map.commit()
+    except Exception as e:
+        log.error("Failed to import legacy state from %s: %s", state_file, e)
+        return
+    log.info("Imported legacy state %s (%d entries, %d logged changes) into %s",
+             state_file, len(legacy_map), replayed, state_map.db_path)
+    _delete_legacy_state(state_file)
+
+def _replay_state_deltas(state_map: Dict[str, Dict[str, Any]], state_file: Path) -> int:
+    """Applies a legacy change log to state_map. A torn trailing line (crash mid-append) ends the replay."""
+    delta_log = _delta_log_path(state_file)
+    replayed = 0
+    if delta_log.exists():
+        try:
+            with open(delta_log, "rb") as f:
+                for line in f:
+                    try:
+                        delta = _json_loads(line)
+                    except json.JSONDecodeError:
+                        log.warning("Discarding incomplete trailing entry in state change log %s", delta_log)
+                        break
+                    for file_id, entry in delta.items():
+                        if entry is None:
+                            state_map.pop(file_id, None)
+                        else:
+                            state_map[file_id] = entry
+                    replayed += 1
+        except Exception as e:
+            log.error("Failed to replay state change log %s: %s", delta_log, e)
+    return replayed
+
+def _delete_legacy_state(state_file: Path):
+    for path in (state_file, _delta_log_path(state_file)):
+        if path.exists():
+            try: path.unlink()
+            except OSError as e: log.error("Failed to delete old state file %s: %s", path, e)
+
+def clear_drive_state(state_map: DriveState, state_file: Path):
+    """Removes every entry from the state map (and any legacy JSON state files) before a full sync."""
+    try:
+        state_map.clear()
+        state_map.commit()
+    except Exception as e:
+        log.error("Failed to clear drive state %s: %s", state_map.db_path, e)
+    _delete_legacy_state(state_file)
+
+def _load_state_snapshot(state_file: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads a legacy JSON state snapshot.
     Handles both old format (dict) and new format ({"total_size_bytes":..., "items":{...}}).
     """
     if state_file.exists():
         try:
-            with open(state_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = _load_json_file(state_file)
 
             # Check for new format (used in dry-run full sync)
             if isinstance(data, dict) and "items" in data and "total_size_bytes" in data:
                 total_size = data.get("total_size_bytes")
                 is_estimated = data.get("google_docs_estimated", False)
                 log.info(
-                    f"Loaded drive state from {state_file}. Recorded total size (dry-run): {total_size} bytes "
-                    f"({'Google Docs estimated/excluded' if is_estimated else ''})."
+                    "Loaded drive state from %s. Recorded total size (dry-run): %s bytes (%s).",
+                    state_file, total_size, 'Google Docs estimated/excluded' if is_estimated else ''
                 )
                 state_map = data["items"]
             # Assume old format or normal run
@@ -39,7 +250,7 @@ def load_drive_state(state_file: Path) -> Dict[str, Dict[str, Any]]:
                  state_map = data
             else:
                  # Should not happen if saved correctly, but handle unexpected format
-                 log.warning(f"State map file {state_file} has unexpected format. Full sync required.")
+                 log.warning("State map file %s has unexpected format. Full sync required.", state_file)
                  return {}
 
             log.info("Drive state map ('items' part) loaded from %s (%d entries)", state_file, len(state_map))
@@ -54,37 +265,27 @@ def load_drive_state(state_file: Path) -> Dict[str, Dict[str, Any]]:
     return {}
 
 def save_drive_state(
-    state_data: Dict[str, Dict[str, Any]],
+    state_map: DriveState,
     state_file: Path,
     total_size_bytes: Optional[int] = None, # Add optional total size
     google_docs_estimated: bool = False     # Add flag for size estimation
 ):
     """
-    Saves the drive state map.
-    If total_size_bytes is provided (only during dry-run full sync),
-    saves a structured JSON with size and items. Otherwise, saves only the state map.
+    Commits the pending changes of the drive state map.
+    If total_size_bytes is provided (only during dry-run full sync), it is recorded alongside the items.
     """
     try:
-        state_file.parent.mkdir(parents=True, exist_ok=True)
-        # Prepare data to be saved based on whether total_size is provided
-        data_to_save: Any
         if total_size_bytes is not None:
-            data_to_save = {
-                "total_size_bytes": total_size_bytes,
-                "google_docs_estimated": google_docs_estimated,
-                "items": state_data
-            }
-            log_msg = f"Drive state map and total size ({total_size_bytes} bytes) saved to {state_file}"
+            state_map.set_meta("total_size_bytes", total_size_bytes)
+            state_map.set_meta("google_docs_estimated", google_docs_estimated)
+            log_args = ("Drive state map and total size (%d bytes) saved to %s", total_size_bytes, state_map.db_path)
         else:
-            data_to_save = state_data
-            log_msg = f"Drive state map saved to {state_file} ({len(state_data)} entries)"
-
-        with open(state_file, "w", encoding="utf-8") as f:
-            json.dump(data_to_save, f, indent=2)
-        log.info(log_msg)
+            log_args = ("Drive state map saved to %s", state_map.db_path)
+        state_map.commit()
+        log.info(*log_args)
 
     except Exception as e:
-        log.error("Failed to save drive state to %s: %s", state_file, e)
+        log.error("Failed to save drive state to %s: %s", state_map.db_path, e)
 
 
 # --- Token Management ---
@@ -106,22 +307,58 @@ def load_start_page_token(token_file: Path) -> Optional[str]:
     return None
 
 def save_start_page_token(token: str, token_file: Path):
-    """Saves the startPageToken to a file."""
+    """Saves the startPageToken to a file (temp file + rename, so a crash never leaves a torn token)."""
     try:
         token_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(token_file, "w") as f:
+        tmp_file = token_file.with_name(token_file.name + ".tmp")
+        with open(tmp_file, "w") as f:
             f.write(token)
+        os.replace(tmp_file, token_file)
         log.info("StartPageToken saved to %s", token_file)
     except Exception as e:
         log.error("Failed to save StartPageToken to %s: %s", token_file, e)
 
+# Single-flight cache for get_initial_start_page_token: {drive_id: (token, obtained_at)}.
+# Reusing a slightly older token is safe - it only means a few more changes are replayed.
+START_TOKEN_CACHE_TTL_SECONDS = 60
+_start_token_cache: Dict[Optional[str], Tuple[str, float]] = {}
+_start_token_locks: Dict[Optional[str], threading.Lock] = {}
+_start_token_locks_guard = threading.Lock()
+
+def _cached_start_page_token(drive_id: Optional[str]) -> Optional[str]:
+    cached = _start_token_cache.get(drive_id)
+    if cached and time.monotonic() - cached[1] < START_TOKEN_CACHE_TTL_SECONDS:
+        return cached[0]
+    return None
+
 def get_initial_start_page_token(service: Resource, drive_id: Optional[str] = None) -> Optional[str]:
-    """Gets the initial startPageToken for the changes API."""
+    """
+    Gets the initial startPageToken for the changes API.
+    Concurrent callers for the same drive share one API call (double-checked, per-drive lock).
+    """
+    token = _cached_start_page_token(drive_id)
+    if token:
+        return token
+    with _start_token_locks_guard:
+        drive_lock = _start_token_locks.setdefault(drive_id, threading.Lock())
+    with drive_lock:
+        # Another thread may have fetched it while we waited
+        token = _cached_start_page_token(drive_id)
+        if token:
+            return token
+        token = _fetch_start_page_token(service, drive_id)
+        if token:
+            _start_token_cache[drive_id] = (token, time.monotonic())
+        return token
+
+def _fetch_start_page_token(service: Resource, drive_id: Optional[str]) -> Optional[str]:
+    """Requests a new startPageToken from the API (through the global rate limiter)."""
     try:
         token_params = {"supportsAllDrives": True}
         if drive_id:
             token_params["driveId"] = drive_id
-        response = service.changes().getStartPageToken(**token_params).execute()
+        with rate_limiter.get_rate_limiter():
+            response = service.changes().getStartPageToken(**token_params).execute()
         token = response.get("startPageToken")
         if token:
             log.info("Obtained initial StartPageToken%s: %s", f" for driveId {drive_id}" if drive_id else "", token)
@@ -131,4 +368,4 @@ def get_initial_start_page_token(service: Resource, drive_id: Optional[str] = No
              return None
     except HttpError as e:
         log.error("API error getting initial StartPageToken%s: %s", f" for driveId {drive_id}" if drive_id else "", e)
-        return None 
\ No newline at end of file
+        return None
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import heapq
 import logging
+import os
 import ssl
+import threading
 import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional, Any, Set, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Any, Set, Tuple
 import random
 
 from googleapiclient.discovery import Resource
@@ -12,6 +17,7 @@ from googleapiclient.errors import HttpError
 import gspread
 
 from . import config
+from . import google_api
 from . import utils
 from . import state_manager
 from . import file_processor
@@ -19,6 +25,161 @@ from . import rate_limiter
 
 log = logging.getLogger(__name__)
 
+# 404s logged individually per changes page; the rest are only counted in the page summary
+NOT_FOUND_LOG_SAMPLES = 3
+# Minimum seconds between full sync progress reports
+PROGRESS_LOG_INTERVAL = 30
+
+# --- Parallel downloads ---
+# Shared by all drives so the total number of concurrent downloads stays at DOWNLOAD_CONCURRENCY
+_download_pool: Optional[ThreadPoolExecutor] = None
+_download_pool_lock = threading.Lock()
+# Per-worker Drive/Sheets clients: the httplib2 transport behind them is not thread-safe
+_worker_local = threading.local()
+
+def _get_download_pool() -> ThreadPoolExecutor:
+    """Returns the shared download pool, creating it on first use."""
+    global _download_pool
+    if _download_pool is None:
+        with _download_pool_lock:
+            if _download_pool is None:
+                _download_pool = ThreadPoolExecutor(max_workers=config.DOWNLOAD_CONCURRENCY, thread_name_prefix="download")
+    return _download_pool
+
+def _worker_clients(creds: Any) -> Tuple[Resource, gspread.Client]:
+    """Returns the Drive and Sheets clients owned by the calling pool thread, creating them on first use."""
+    clients = getattr(_worker_local, "clients", None)
+    if clients is None or clients[0] is not creds:
+        clients = (creds, *google_api.create_service_clients_from_creds(creds))
+        _worker_local.clients = clients
+    return clients[1], clients[2]
+
+def _fetch_in_worker(creds: Any, fetch: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+    """Runs fetch(drive_service, *args) on the prefetch thread, using the Drive client owned by that thread."""
+    drive_service, _ = _worker_clients(creds)
+    return fetch(drive_service, *args)
+
+def _prefetch_page(pool: ThreadPoolExecutor, creds: Any, fetch: Callable[..., Dict[str, Any]], *args: Any) -> Optional[Future]:
+    """
+    Starts fetch(drive_service, *args) for the next listing page on pool and returns its Future.
+    Returns None without creds; the caller then fetches the page inline when it needs it.
+    """
+    if creds is None:
+        return None
+    return pool.submit(_fetch_in_worker, creds, fetch, *args)
+
+def _download_in_worker(creds: Any, item: Dict[str, Any], local_path_base: Path) -> Tuple[bool, Path]:
+    """Runs download_file on a pool thread, using API clients owned by that thread."""
+    drive_service, gspread_client = _worker_clients(creds)
+    # Pace download starts through the shared limiter without holding a slot for the whole transfer
+    limiter = rate_limiter.get_rate_limiter()
+    limiter.acquire()
+    limiter.release()
+    return file_processor.download_file(
+        service=drive_service,
+        item=item,
+        local_path_base=local_path_base,
+        gspread_client=gspread_client
+    )
+
+def _submit_download(
+    creds: Any,
+    drive_service: Resource,
+    gspread_client: Optional[gspread.Client],
+    item: Dict[str, Any],
+    local_path_base: Path,
+    in_flight: Dict[Path, Future]
+) -> Future:
+    """
+    Starts download_file for item on the download pool and returns its Future.
+    Without creds (or with DOWNLOAD_CONCURRENCY <= 1) the download runs inline on drive_service.
+    A download to a path that is already in flight waits for the earlier one, so two items never write one file at once.
+    """
+    if creds is None or config.DOWNLOAD_CONCURRENCY <= 1:
+        future = Future()
+        try:
+            future.set_result(file_processor.download_file(
+                service=drive_service,
+                item=item,
+                local_path_base=local_path_base,
+                gspread_client=gspread_client
+            ))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    previous = in_flight.get(local_path_base)
+    if previous is not None:
+        try: previous.result()
+        except Exception: pass # Reported when the earlier download is collected
+    future = _get_download_pool().submit(_download_in_worker, creds, item, local_path_base)
+    in_flight[local_path_base] = future
+    return future
+
+class _DryRunSampler:
+    """
+    Picks the dry run sample in a single pass over the listing, keeping O(sample_size) items:
+    up to half the sample is a uniform random choice of folders (reservoir sampling, Algorithm R),
+    the rest the smallest files of at most max_file_size bytes. When the listing has neither,
+    a uniform random choice of all items is used instead.
+    """
+    def __init__(self, sample_size: int, max_file_size: int):
+        self.sample_size = sample_size
+        self.max_file_size = max_file_size
+        self.folders: List[Dict[str, Any]] = []
+        self.folders_seen = 0
+        # Max-heap (negated keys) of the sample_size smallest files; ties keep the earlier listed file
+        self.small_files: List[Tuple[int, int, Dict[str, Any]]] = []
+        self.items: List[Dict[str, Any]] = []
+        self.items_seen = 0
+        self.fell_back = False
+
+    @staticmethod
+    def _reservoir_add(reservoir: List[Dict[str, Any]], seen: int, item: Dict[str, Any], k: int):
+        """Algorithm R: keeps reservoir a uniform sample of at most k of the seen + 1 items offered so far."""
+        if seen < k:
+            reservoir.append(item)
+        else:
+            j = random.randrange(seen + 1)
+            if j < k:
+                reservoir[j] = item
+
+    def add(self, item: Dict[str, Any]):
+        self._reservoir_add(self.items, self.items_seen, item, self.sample_size)
+        self.items_seen += 1
+        if item.get("mimeType") == config.FOLDER_MIME_TYPE:
+            self._reservoir_add(self.folders, self.folders_seen, item, self.sample_size // 2)
+            self.folders_seen += 1
+            return
+        size = int(item.get("size", 0))
+        if size > self.max_file_size or self.sample_size <= 0:
+            return
+        entry = (-size, -self.items_seen, item)
+        if len(self.small_files) < self.sample_size:
+            heapq.heappush(self.small_files, entry)
+        elif entry[:2] > self.small_files[0][:2]:
+            heapq.heapreplace(self.small_files, entry)
+
+    def sample(self) -> List[Dict[str, Any]]:
+        sampled_items = list(self.folders)
+        # Fill remaining sample slots with the smallest files
+        remaining_sample_size = self.sample_size - len(sampled_items)
+        if remaining_sample_size > 0:
+            smallest = sorted(self.small_files, key=lambda entry: entry[:2], reverse=True)
+            sampled_items.extend(item for _, _, item in smallest[:remaining_sample_size])
+        if not sampled_items and self.items_seen:
+            self.fell_back = True
+            sampled_items = list(self.items)
+        return sampled_items
+
+def _ensure_dir(path: Path, created_dirs: Set[Path]):
+    """mkdir -p that skips directories already created (or seen) during this sync, along with their ancestors."""
+    if path in created_dirs:
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    created_dirs.add(path)
+    created_dirs.update(path.parents)
+
 def process_drive(
     drive_service: Resource,
     gspread_client: Optional[gspread.Client],
@@ -28,7 +189,8 @@ def process_drive(
     drive_state_dir: Path,
     processed_shared_drive_ids: Set[str],
     incremental_flag: bool,
-    dry_run: bool
+    dry_run: bool,
+    creds: Any = None # Enables parallel downloads on per-thread clients; None downloads on drive_service
 ) -> Tuple[int, int, int, int, str]:
     """
     Process a single drive (My Drive or Shared Drive).
@@ -49,175 +211,216 @@ def process_drive(
     
     # Load state map. If incremental, also try to load token.
     state_map = state_manager.load_drive_state(state_file)
-    start_token = None
-    needs_full_sync = False
+    try:
+        start_token = None
+        needs_full_sync = False
     
-    if incremental_flag:
-        start_token = state_manager.load_start_page_token(token_file)
-        if not start_token:
-            log.warning(f"No start token found for {drive_name}. Performing full sync.")
-            needs_full_sync = True
-            # Clear potentially stale state map if token is missing
-            state_map = {}
-            if state_file.exists():
-                 log.warning("Deleting old state map %s before full sync (token missing).", state_file)
-                 try: state_file.unlink()
-                 except OSError as e: log.error("Failed to delete old state map: %s", e)
+        if incremental_flag:
+            start_token = state_manager.load_start_page_token(token_file)
+            if not start_token:
+                log.warning(f"No start token found for {drive_name}. Performing full sync.")
+                needs_full_sync = True
+                # Keep the state of an earlier, unfinished sync: the full sync reuses unchanged files and prunes the rest
+                if state_map:
+                     log.warning("Reusing %d entries of state map %s for full sync (token missing). Use --full to start from scratch.",
+                                 len(state_map), state_map.db_path)
+            else:
+                 log.info(f"Found start token for {drive_name}. Proceeding with incremental sync.")
         else:
-             log.info(f"Found start token for {drive_name}. Proceeding with incremental sync.")
-    else:
-        log.warning(f"Incremental flag not set for {drive_name}. Performing full sync.")
-        needs_full_sync = True
-        # Clear state and token files for a clean full sync
-        state_map = {}
-        if state_file.exists():
-             log.warning("Deleting old state map %s before forced full sync.", state_file)
-             try: state_file.unlink()
-             except OSError as e: log.error("Failed to delete old state map: %s", e)
-        if token_file.exists():
-            log.warning("Deleting old start token %s before forced full sync.", token_file)
-            try: token_file.unlink(missing_ok=True)
-            except OSError as e: log.error("Failed to delete old start token file: %s", e)
-
-    # --- Perform Sync ---    
-    if needs_full_sync:
-        # Full sync mode
-        log.info(f"Starting full sync for {drive_name} using files.list")
-        try:
-            # Perform the full sync which populates the state_map
-            processed, downloaded, deleted, failed, shortcuts_skipped = perform_full_sync(
-                drive_service=drive_service,
-                gspread_client=gspread_client,
-                drive_id=drive_id,
-                drive_name=drive_name,
-                drive_backup_dir=drive_backup_dir,
-                state_map=state_map, # Pass the map to be populated
-                processed_shared_drive_ids=processed_shared_drive_ids,
-                dry_run=dry_run
-            )
+            log.warning(f"Incremental flag not set for {drive_name}. Performing full sync.")
+            needs_full_sync = True
+            # Clear state and token files for a clean full sync
+            if state_map:
+                 log.warning("Clearing old state map %s before forced full sync.", state_map.db_path)
+            state_manager.clear_drive_state(state_map, state_file)
+            if token_file.exists():
+                log.warning("Deleting old start token %s before forced full sync.", token_file)
+                try: token_file.unlink(missing_ok=True)
+                except OSError as e: log.error("Failed to delete old start token file: %s", e)
+
+        # --- Perform Sync ---    
+        if needs_full_sync:
+            # Full sync mode
+            log.info(f"Starting full sync for {drive_name} using files.list")
+            try:
+                # Perform the full sync which populates the state_map
+                processed, downloaded, deleted, failed, shortcuts_skipped, listing_complete = perform_full_sync(
+                    drive_service=drive_service,
+                    gspread_client=gspread_client,
+                    drive_id=drive_id,
+                    drive_name=drive_name,
+                    drive_backup_dir=drive_backup_dir,
+                    state_map=state_map, # Pass the map to be populated
+                    processed_shared_drive_ids=processed_shared_drive_ids,
+                    dry_run=dry_run,
+                    creds=creds
+                )
             
-            processed_count += processed
-            downloaded_count += downloaded
-            # deleted_count is 0 from perform_full_sync
-            failed_count += failed
-            shortcuts_skipped_count += shortcuts_skipped
+                processed_count += processed
+                downloaded_count += downloaded
+                deleted_count += deleted # Stale entries pruned from a reused state map
+                failed_count += failed
+                shortcuts_skipped_count += shortcuts_skipped
             
-            # After successful full sync, get the initial start token for the *next* run
-            # Calculate success rate - save token if 98%+ successful (excluding Google Shortcuts from calculation)
-            effective_processed = processed_count  # Total processed files (including shortcuts that were attempted)
-            critical_failures = failed_count  # All failures are considered for now
+                # After successful full sync, get the initial start token for the *next* run
+                # Calculate success rate - save token if 98%+ successful (excluding Google Shortcuts from calculation)
+                effective_processed = processed_count  # Total processed files (including shortcuts that were attempted)
+                critical_failures = failed_count  # All failures are considered for now
             
-            success_rate = (effective_processed - critical_failures) / effective_processed if effective_processed > 0 else 0
-            success_percentage = success_rate * 100
+                success_rate = (effective_processed - critical_failures) / effective_processed if effective_processed > 0 else 0
+                success_percentage = success_rate * 100
             
-            if shortcuts_skipped_count > 0:
-                log.info(f"Full sync for {drive_name}: {shortcuts_skipped_count} Google Shortcuts were skipped (not counted as failures)")
+                if shortcuts_skipped_count > 0:
+                    log.info(f"Full sync for {drive_name}: {shortcuts_skipped_count} Google Shortcuts were skipped (not counted as failures)")
             
-            if success_rate >= 0.98: # Save token if 98%+ successful
-                log.info(f"Full sync for {drive_name} achieved {success_percentage:.1f}% success rate ({effective_processed - critical_failures}/{effective_processed}). Saving token.")
-                new_start_token = state_manager.get_initial_start_page_token(drive_service, drive_id)
-                if new_start_token:
-                    if not dry_run:
-                        # Save the populated state map and the new start token
-                        state_manager.save_drive_state(state_map, state_file) 
-                        state_manager.save_start_page_token(new_start_token, token_file)
-                        log.info(f"Full sync for {drive_name} completed. State and new token saved.")
+                if not listing_complete:
+                    log.warning(f"Full sync for {drive_name} was aborted before all items were listed. Token not saved; the next run performs a full sync again.")
+                    state_manager.save_drive_state(state_map, state_file)
+                elif success_rate >= 0.98: # Save token if 98%+ successful
+                    log.info(f"Full sync for {drive_name} achieved {success_percentage:.1f}% success rate ({effective_processed - critical_failures}/{effective_processed}). Saving token.")
+                    new_start_token = state_manager.get_initial_start_page_token(drive_service, drive_id)
+                    if new_start_token:
+                        if not dry_run:
+                            # Save the populated state map and the new start token
+                            state_manager.save_drive_state(state_map, state_file) 
+                            state_manager.save_start_page_token(new_start_token, token_file)
+                            log.info(f"Full sync for {drive_name} completed. State and new token saved.")
+                        else:
+                            # Save state map (potentially with size info if perform_full_sync added it), but not token
+                            # Note: Current perform_full_sync doesn't calculate size, but save_drive_state handles it if passed.
+                            state_manager.save_drive_state(state_map, state_file, total_size_bytes=None)
+                            log.info(f"Full sync (DRY RUN) for {drive_name} completed. State map saved, token not saved.")
                     else:
-                        # Save state map (potentially with size info if perform_full_sync added it), but not token
-                        # Note: Current perform_full_sync doesn't calculate size, but save_drive_state handles it if passed.
-                        state_manager.save_drive_state(state_map, state_file, total_size_bytes=None)
-                        log.info(f"Full sync (DRY RUN) for {drive_name} completed. State map saved, token not saved.")
+                         log.error(f"Failed to get initial start token after full sync for {drive_name}. Next run will require another full sync.")
+                         # Still save the state we got, even if the token failed
+                         state_manager.save_drive_state(state_map, state_file)
+                         failed_count += 1 # Add a failure for the token fetch
                 else:
-                     log.error(f"Failed to get initial start token after full sync for {drive_name}. Next run will require another full sync.")
-                     # Still save the state we got, even if the token failed
-                     state_manager.save_drive_state(state_map, state_file)
-                     failed_count += 1 # Add a failure for the token fetch
-            else:
-                log.warning(f"Full sync for {drive_name} had {success_percentage:.1f}% success rate ({processed_count - failed_count}/{processed_count}). Token not saved due to low success rate (<98%).")
-                # Save potentially incomplete state anyway for debugging?
-                state_manager.save_drive_state(state_map, state_file)
+                    log.warning(f"Full sync for {drive_name} had {success_percentage:.1f}% success rate ({processed_count - failed_count}/{processed_count}). Token not saved due to low success rate (<98%).")
+                    # Save potentially incomplete state anyway for debugging?
+                    state_manager.save_drive_state(state_map, state_file)
                 
-        except HttpError as e:
-            # Handle errors during the full sync process itself (e.g., auth errors)
-            if e.resp.status == 401:
-                log.error(f"Authorization error during full sync for {drive_name}. Please re-authenticate.")
-                raise # Re-raise to stop the main loop
-            else:
-                log.error(f"API error during full sync for {drive_name}: {e}")
+            except HttpError as e:
+                # Handle errors during the full sync process itself (e.g., auth errors)
+                if e.resp.status == 401:
+                    log.error(f"Authorization error during full sync for {drive_name}. Please re-authenticate.")
+                    raise # Re-raise to stop the main loop
+                else:
+                    log.error(f"API error during full sync for {drive_name}: {e}")
+                    failed_count += 1
+            except Exception as e:
+                log.error(f"Error during full sync for {drive_name}: {e}", exc_info=True)
                 failed_count += 1
-        except Exception as e:
-            log.error(f"Error during full sync for {drive_name}: {e}", exc_info=True)
-            failed_count += 1
             
-    else: # Incremental sync mode (token was loaded successfully)
-        log.info(f"Starting incremental sync for {drive_name} from token: {start_token[:10]}...")
-        try:
-            # Use process_changes for incremental sync
-            processed, downloaded, deleted, failed = process_changes(
-                drive_service=drive_service,
-                gspread_client=gspread_client,
-                drive_id=drive_id,
-                drive_name=drive_name,
-                drive_backup_dir=drive_backup_dir,
-                state_map=state_map, # Pass the loaded state map
-                start_token=start_token, # Pass the loaded token
-                processed_shared_drive_ids=processed_shared_drive_ids,
-                dry_run=dry_run
-            )
+        else: # Incremental sync mode (token was loaded successfully)
+            log.info(f"Starting incremental sync for {drive_name} from token: {start_token[:10]}...")
+            try:
+                # Use process_changes for incremental sync
+                processed, downloaded, deleted, failed = process_changes(
+                    drive_service=drive_service,
+                    gspread_client=gspread_client,
+                    drive_id=drive_id,
+                    drive_name=drive_name,
+                    drive_backup_dir=drive_backup_dir,
+                    state_map=state_map, # Pass the loaded state map; changes are committed page by page
+                    start_token=start_token, # Pass the loaded token
+                    token_file=token_file, # Advanced after every committed page (not in dry run)
+                    processed_shared_drive_ids=processed_shared_drive_ids,
+                    dry_run=dry_run,
+                    creds=creds
+                )
             
-            processed_count += processed
-            downloaded_count += downloaded
-            deleted_count += deleted
-            failed_count += failed
+                processed_count += processed
+                downloaded_count += downloaded
+                deleted_count += deleted
+                failed_count += failed
             
-            # process_changes should update the state_map directly
-            # It also handles getting and saving the *new* start token internally if not dry_run
-            # So, we just need to save the final state map after the loop finishes
-            if not dry_run:
-                state_manager.save_drive_state(state_map, state_file)
-                log.info(f"Incremental sync for {drive_name} finished. Final state saved.")
-                # Token saving is handled within process_changes loop
-            else:
-                 state_manager.save_drive_state(state_map, state_file)
-                 log.info(f"Incremental sync (DRY RUN) for {drive_name} finished. State saved, token not saved.")
+                # process_changes updates the state_map directly and logs every change as it happens;
+                # the snapshot is compacted once in the finally block below
+                if not dry_run:
+                    log.info(f"Incremental sync for {drive_name} finished.")
+                    # Token saving is handled within process_changes loop
+                else:
+                     log.info(f"Incremental sync (DRY RUN) for {drive_name} finished. Token not saved.")
 
-        except HttpError as e:
-            if e.resp.status == 401:
-                log.error(f"Authorization error during incremental sync for {drive_name}. Please re-authenticate.")
-                raise # Re-raise to stop main loop
-            elif e.resp.status == 404 and "pageToken not found" in str(e):
-                log.error(f"Invalid page token during incremental sync for {drive_name}. Full sync needed on next run.")
-                # State saving is skipped here, as the sync failed mid-way
-                failed_count += 1
-                # Don't re-raise here? Allow script to continue with other drives, but log the failure.
-            else:
-                log.error(f"API error during incremental sync for {drive_name}: {e}")
+            except HttpError as e:
+                if e.resp.status == 401:
+                    log.error(f"Authorization error during incremental sync for {drive_name}. Please re-authenticate.")
+                    raise # Re-raise to stop main loop
+                elif e.resp.status == 404 and "pageToken not found" in str(e):
+                    log.error(f"Invalid page token during incremental sync for {drive_name}. Full sync needed on next run.")
+                    # Pages committed before the failure are kept
+                    failed_count += 1
+                    # Don't re-raise here? Allow script to continue with other drives, but log the failure.
+                else:
+                    log.error(f"API error during incremental sync for {drive_name}: {e}")
+                    failed_count += 1
+            except Exception as e:
+                log.error(f"Error during incremental sync for {drive_name}: {e}", exc_info=True)
                 failed_count += 1
-                # Save state map as it is after the error?
+            finally:
+                # Pages are committed as they complete; this commits whatever the last (possibly aborted) page changed
                 state_manager.save_drive_state(state_map, state_file)
-        except Exception as e:
-            log.error(f"Error during incremental sync for {drive_name}: {e}", exc_info=True)
-            failed_count += 1
-            # Save state map as it is after the error?
-            state_manager.save_drive_state(state_map, state_file)
-    
+    finally:
+        # Also on the re-raised errors above: commits what was synced so far and releases the database
+        state_map.close()
     actual_mode = "full" if needs_full_sync else "incremental"
     log.info(f"--- Finished processing for drive: {drive_name} --- Counts: Processed={processed_count}, Downloaded={downloaded_count}, Deleted={deleted_count}, Failed={failed_count}")
     return processed_count, downloaded_count, deleted_count, failed_count, actual_mode
 
+def _move_unchanged_item(
+    state_map: state_manager.DriveState,
+    file_id: str,
+    prev: state_manager.StateEntry,
+    new_path: Path,
+    modified_time: Optional[str],
+    drive_backup_dir: Path
+) -> bool:
+    """
+    Moves the existing local copy of an item whose content did not change (rename/move) to new_path
+    and updates its state entry - for a folder, also the entries of everything below it.
+    Returns False when there is no usable local copy, so the caller downloads the item instead.
+    """
+    old_path = drive_backup_dir / prev.path
+    new_rel_path = str(new_path.relative_to(drive_backup_dir))
+    if old_path != new_path:
+        if not old_path.exists() or new_path.exists():
+            return False
+        try:
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(old_path, new_path)
+        except OSError as e:
+            log.warning(f"Could not move {old_path} to {new_path}: {e}. Downloading instead.")
+            return False
+        if prev.is_folder:
+            state_map.move_tree(prev.path, new_rel_path)
+    elif not old_path.exists():
+        return False
+    state_map[file_id] = prev._replace(path=new_rel_path, modified_time=modified_time)
+    return True
+
+def _list_changes_page(drive_service: Resource, changes_params: Dict[str, Any]) -> Dict[str, Any]:
+    """Fetches one page of changes.list, paced through the shared rate limiter."""
+    with rate_limiter.get_rate_limiter():
+        return drive_service.changes().list(**changes_params).execute()
+
 def process_changes(
     drive_service: Resource,
     gspread_client: Optional[gspread.Client],
     drive_id: Optional[str],
     drive_name: str,
     drive_backup_dir: Path,
-    state_map: Dict[str, Dict[str, Any]],
+    state_map: state_manager.DriveState,
     start_token: str,
+    token_file: Path,
     processed_shared_drive_ids: Set[str],
-    dry_run: bool
+    dry_run: bool,
+    creds: Any = None
 ) -> Tuple[int, int, int, int]:
     """
     Process changes from the Drive API.
+    Downloads of a page run in parallel; their results are applied to state_map and committed before the next page is fetched,
+    then the start token in token_file is advanced past the page (unless dry_run or a page had failures).
     Returns (processed_count, downloaded_count, deleted_count, failed_count).
     """
     processed_count = 0
@@ -225,179 +428,317 @@ def process_changes(
     deleted_count = 0
     failed_count = 0
     
-    page_token = start_token
-    while page_token:
+    # Bound once: the per-change loop would otherwise repeat these module attribute lookups for every change
+    folder_mime_type = config.FOLDER_MIME_TYPE
+    reconstruct_path = file_processor.reconstruct_and_create_path
+    local_file_path = file_processor.local_file_path
+    created_dirs: Set[Path] = set() # Directories already created by _ensure_dir
+    # Shared Drive filtering is decided per drive, not per change
+    is_my_drive_processing = drive_id is None
+    drive_already_processed = bool(drive_id and drive_id in processed_shared_drive_ids)
+    # Routine per-change outcomes are counted here and logged as one summary per page
+    page_stats: Counter = Counter()
+    
+    def _note_not_found(file_id: str, file_name: str):
+        """Drops a file that no longer exists (404) from state_map. Only the first few per page are logged."""
+        nonlocal deleted_count
+        page_stats["not_found"] += 1
+        if page_stats["not_found"] <= NOT_FOUND_LOG_SAMPLES:
+            log.warning(f"File not found (404): {file_name}")
+        if file_id in state_map:
+            deleted_count += 1
+            state_map.pop(file_id, None)
+    
+    def _collect_download(future: Future, file_id: str, file_name: str, mime_type: str, modified_time: Optional[str]):
+        """Applies the result of one download to the counters and state_map (main thread only)."""
+        nonlocal downloaded_count, failed_count
         try:
-            # Get changes
-            changes_params = {
-                "pageToken": page_token,
-                "spaces": "drive",
-                "fields": "nextPageToken, newStartPageToken, changes(fileId, time, file(id, name, mimeType, size, parents, trashed))",
-                "supportsAllDrives": True,
-                "includeItemsFromAllDrives": True
-            }
-            if drive_id:
-                changes_params["driveId"] = drive_id
-                
-            changes_result = drive_service.changes().list(**changes_params).execute()
-            changes = changes_result.get("changes", [])
+            success, final_path = future.result()
+        except HttpError as e:
+            if e.resp.status == 404:
+                _note_not_found(file_id, file_name)
+            else:
+                log.error(f"API error processing file {file_name}: {e}")
+                failed_count += 1
+            return
+        except Exception as e:
+            log.error(f"Error processing file {file_name}: {e}", exc_info=utils.sample_traceback())
+            failed_count += 1
+            return
+        
+        if success:
+            downloaded_count += 1
+            # Update state map
+            state_map[file_id] = state_manager.StateEntry(
+                path=str(final_path.relative_to(drive_backup_dir)),
+                modified_time=modified_time,
+                is_folder=mime_type == folder_mime_type
+            )
+            page_stats["downloaded"] += 1
+        else:
+            failed_count += 1
+            log.error(f"Failed to download/update: {file_name}")
+    
+    # Only the fields consumed below: size feeds download_file's progress bar and export-size check,
+    # driveId the Shared Drive filtering during 'My Drive' sync, modifiedTime the unchanged-content check
+    changes_params = {
+        "pageSize": 1000,
+        "fields": "nextPageToken, newStartPageToken, changes(time, file(id, name, mimeType, size, modifiedTime, parents, trashed, driveId))",
+        "supportsAllDrives": True,
+        "includeItemsFromAllDrives": True
+    }
+    if drive_id:
+        changes_params["driveId"] = drive_id # Implies the drive space
+    else:
+        changes_params["spaces"] = "drive"
+    
+    page_token = start_token
+    save_token = not dry_run
+    next_page: Optional[Future] = None
+    # One thread per drive fetches the next page while the current one is processed;
+    # drives synced in parallel each get their own, so their prefetches do not queue behind each other
+    prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+    try:
+        while page_token:
+            failed_before_page = failed_count
+            try:
+                # Get changes: the page prefetched during the previous iteration, if any
+                if next_page is not None:
+                    changes_result = next_page.result()
+                    next_page = None
+                else:
+                    changes_result = _list_changes_page(drive_service, {**changes_params, "pageToken": page_token})
+                # Fetch the following page while this one is processed
+                if changes_result.get("nextPageToken"):
+                    next_page = _prefetch_page(prefetch_pool, creds, _list_changes_page, {**changes_params, "pageToken": changes_result["nextPageToken"]})
+                changes = changes_result.get("changes", [])
             
-            # Process each change
-            for change in changes:
-                processed_count += 1
-                
-                # Get file details
-                file_details = change.get("file", {})
-                if not file_details:
-                    continue
+                # Skip if the drive itself was already processed as a shared drive
+                if drive_already_processed:
+                    changes = []
+            
+                # Resolve the page's uncached ancestor folders in batched requests up front,
+                # so path reconstruction below does not issue one files.get per ancestor
+                file_processor.prefetch_parents(
+                    drive_service,
+                    (change["file"]["parents"][0] for change in changes
+                     if change.get("file") and change["file"].get("parents") and not change["file"].get("trashed", False)),
+                    drive_id
+                )
+            
+                # Process each change; downloads are submitted here and collected at the end of the page
+                pending_downloads = []
+                in_flight: Dict[Path, Future] = {}
+                page_stats.clear()
+                try:
+                    for change in changes:
+                        # Get file details
+                        file_details = change.get("file") or {}
                     
-                file_id = file_details.get("id")
-                if not file_id:
-                    continue
+                        # --- Skip Shared Drive files when processing 'My Drive' incrementally ---
+                        # Checked before any other per-change work; deletions are still applied below
+                        shared_drive_id = file_details.get("driveId")
+                        if (is_my_drive_processing and shared_drive_id in processed_shared_drive_ids
+                                and not file_details.get("trashed", False)):
+                            page_stats["skipped_shared_drive"] += 1
+                            continue
                     
-                # Skip if file is in a shared drive we've already processed
-                if drive_id and drive_id in processed_shared_drive_ids:
-                    continue
+                        processed_count += 1
+                        if not file_details:
+                            continue
                     
-                        # --- Skip Shared Drive files when processing 'My Drive' incrementally ---
-                is_my_drive_processing = drive_id is None
-                shared_drive_id = file_details.get("driveId") if file_details else None # Get driveId from file_details if available
-
-                # We only apply this logic if the change is NOT a deletion and we are in My Drive sync
-                if is_my_drive_processing and shared_drive_id and not file_details.get("trashed", False):
-                    if shared_drive_id in processed_shared_drive_ids:
-                        # Skip logging for each skipped file to reduce log spam
-                        continue # Skip processing this change
-                    else:
-                        # Handle change for item belonging to a shared drive NOT processed separately
-                        item_name = file_details.get("name", "_unnamed_")
-                        log.warning(f"Change for item '{item_name}' ({file_id}) found during 'My Drive' sync belongs to Shared Drive {shared_drive_id} (NOT processed separately). Processing in '{config.SHARED_FILES_DIR_NAME}'.")
-                        target_dir = config.SHARED_FILES_DIR / shared_drive_id
-                        target_dir.mkdir(parents=True, exist_ok=True)
-                        target_path_base = target_dir / utils.sanitize_filename(item_name)
-                        mime_type = file_details.get("mimeType")
-
-                        # processed_count was already incremented at the start of the loop
-                        if mime_type == config.FOLDER_MIME_TYPE:
-                            try:
-                                target_path_base.mkdir(parents=True, exist_ok=True)
-                                downloaded_count += 1
-                            except OSError as e:
-                                log.error(f"Failed to create folder in Shared With Me dir: {target_path_base} - {e}")
-                                failed_count += 1
-                        elif mime_type:
-                            # Download/update without adding to state map or S3
-                            success, _ = file_processor.download_file(
-                                service=drive_service,
-                                item=file_details, # Use file_details from the change
-                                local_path_base=target_path_base,
-                                gspread_client=gspread_client
-                            )
-                            if success:
-                                downloaded_count += 1
+                        file_id = file_details.get("id")
+                        if not file_id:
+                            continue
+
+                        # We only apply this logic if the change is NOT a deletion and we are in My Drive sync
+                        if is_my_drive_processing and shared_drive_id and not file_details.get("trashed", False):
+                            # Handle change for item belonging to a shared drive NOT processed separately
+                            item_name = file_details.get("name", "_unnamed_")
+                            log.debug(f"Change for item '{item_name}' ({file_id}) found during 'My Drive' sync belongs to Shared Drive {shared_drive_id} (NOT processed separately). Processing in '{config.SHARED_FILES_DIR_NAME}'.")
+                            page_stats["unprocessed_shared_drive"] += 1
+                            target_dir = config.SHARED_FILES_DIR / shared_drive_id
+                            _ensure_dir(target_dir, created_dirs)
+                            target_path_base = target_dir / utils.sanitize_filename(item_name)
+                            mime_type = file_details.get("mimeType")
+
+                            # processed_count was already incremented at the start of the loop
+                            if mime_type == folder_mime_type:
+                                try:
+                                    _ensure_dir(target_path_base, created_dirs)
+                                    downloaded_count += 1
+                                except OSError as e:
+                                    log.error(f"Failed to create folder in Shared With Me dir: {target_path_base} - {e}")
+                                    failed_count += 1
+                            elif mime_type:
+                                # Download/update without adding to state map or S3
+                                success, _ = file_processor.download_file(
+                                    service=drive_service,
+                                    item=file_details, # Use file_details from the change
+                                    local_path_base=target_path_base,
+                                    gspread_client=gspread_client
+                                )
+                                if success:
+                                    downloaded_count += 1
+                                else:
+                                    failed_count += 1
                             else:
+                                log.warning(f"Item '{item_name}' in Shared Drive {shared_drive_id} has no mimeType. Skipping change.")
                                 failed_count += 1
-                        else:
-                            log.warning(f"Item '{item_name}' in Shared Drive {shared_drive_id} has no mimeType. Skipping change.")
-                            failed_count += 1
-                        continue # Skip normal processing and state map update
-                #elif is_my_drive_processing and is_removed and file_id in some_way_to_track_shared_files:
-                    # Handle deletion of a shared file - currently not implemented easily
-                    # log.info(f"Deletion detected for item {file_id} potentially in Shared With Me. Manual cleanup may be needed.")
+                            continue # Skip normal processing and state map update
+                        #elif is_my_drive_processing and is_removed and file_id in some_way_to_track_shared_files:
+                            # Handle deletion of a shared file - currently not implemented easily
+                            # log.info(f"Deletion detected for item {file_id} potentially in Shared With Me. Manual cleanup may be needed.")
 
-                # Handle file changes
-                try:
-                    if file_details.get("trashed", False):
-                        # File was deleted
-                        if file_id in state_map:
-                            deleted_count += 1
-                            del state_map[file_id]
-                            log.info(f"Deleted file: {file_details.get('name', file_id)}")
-                    else:
-                        # File was modified or created
-                        file_name = file_details.get("name", "_unnamed_")
-                        mime_type = file_details.get("mimeType", "")
+                        # A renamed/moved/trashed folder invalidates cached paths below it
+                        if file_details.get("mimeType") == folder_mime_type:
+                            file_processor.refresh_cached_item(file_details)
+                    
+                        # Handle file changes
+                        try:
+                            if file_details.get("trashed", False):
+                                # File was deleted
+                                if file_id in state_map:
+                                    deleted_count += 1
+                                    state_map.pop(file_id, None)
+                                    page_stats["deleted"] += 1
+                            else:
+                                # File was modified or created
+                                file_name = file_details.get("name", "_unnamed_")
+                                mime_type = file_details.get("mimeType", "")
                         
-                        # Skip folders in dry run
-                        if dry_run and mime_type == config.FOLDER_MIME_TYPE:
-                            continue
+                                # Skip folders in dry run
+                                if dry_run and mime_type == folder_mime_type:
+                                    continue
                             
-                        # Get or create local path
-                        local_path = file_processor.reconstruct_and_create_path(
-                            service=drive_service,
-                            item_id=file_id,
-                            item_name=file_name,
-                            item_parents=file_details.get("parents", []),
-                            drive_id=drive_id,
-                            drive_backup_dir=drive_backup_dir
-                        )
+                                # Get or create local path
+                                local_path = reconstruct_path(
+                                    service=drive_service,
+                                    item_id=file_id,
+                                    item_name=file_name,
+                                    item_parents=file_details.get("parents", []),
+                                    drive_id=drive_id,
+                                    drive_backup_dir=drive_backup_dir
+                                )
                         
-                        if not local_path:
-                            log.error(f"Failed to get local path for {file_name}")
-                            failed_count += 1
-                            continue
+                                if not local_path:
+                                    log.error(f"Failed to get local path for {file_name}")
+                                    failed_count += 1
+                                    continue
                             
-                        # Download file
-                        success, final_path = file_processor.download_file(
-                            service=drive_service,
-                            item=file_details,
-                            local_path_base=local_path,
-                            gspread_client=gspread_client
-                        )
-                        
-                        if success:
-                            downloaded_count += 1
-                            # Update state map
-                            state_map[file_id] = {
-                                "path": str(final_path.relative_to(drive_backup_dir)),
-                                "modifiedTime": change.get("time"),
-                                "is_folder": mime_type == config.FOLDER_MIME_TYPE
-                            }
-                            # Reduce logging frequency - only log every 100th file or important files
-                            if processed_count % 100 == 0 or mime_type in config.GOOGLE_DOCS_MIMETYPES:
-                                log.info(f"Downloaded/updated: {file_name} (processed {processed_count} items)")
-                        else:
-                            failed_count += 1
-                            log.error(f"Failed to download/update: {file_name}")
+                                # Content unchanged since the last backup (rename, move or other metadata-only change):
+                                # move the local copy instead of downloading it again. Folders have no content to compare.
+                                modified_time = file_details.get("modifiedTime") or change.get("time")
+                                prev = state_map.get(file_id)
+                                is_folder = mime_type == folder_mime_type
+                                if (prev is not None and prev.is_folder == is_folder
+                                        and (is_folder or prev.modified_time == modified_time)):
+                                    new_path = local_file_path(mime_type, local_path)
+                                    if drive_backup_dir / prev.path != new_path and pending_downloads:
+                                        # Downloads submitted earlier may still write below the old location and record
+                                        # their old paths in state_map: finish them before the local copy is moved
+                                        for job in pending_downloads:
+                                            _collect_download(*job)
+                                        pending_downloads.clear()
+                                        in_flight.clear()
+                                    if _move_unchanged_item(state_map, file_id, prev, new_path, modified_time, drive_backup_dir):
+                                        page_stats["moved"] += 1
+                                        continue
                             
-                except HttpError as e:
-                    if e.resp.status == 404:
-                        log.warning(f"File not found (404): {file_details.get('name', file_id)}")
-                        if file_id in state_map:
-                            deleted_count += 1
-                            del state_map[file_id]
-                    else:
-                        log.error(f"API error processing file {file_details.get('name', file_id)}: {e}")
-                        failed_count += 1
-                except Exception as e:
-                    log.error(f"Error processing file {file_details.get('name', file_id)}: {e}", exc_info=True)
-                    failed_count += 1
-                    
-            # Get next page token
-            page_token = changes_result.get("nextPageToken")
+                                # Download file on the pool; the result is applied to state_map by _collect_download
+                                future = _submit_download(creds, drive_service, gspread_client, file_details, local_path, in_flight)
+                                pending_downloads.append((future, file_id, file_name, mime_type, modified_time))
+                            
+                        except HttpError as e:
+                            if e.resp.status == 404:
+                                _note_not_found(file_id, file_details.get('name', file_id))
+                            else:
+                                log.error(f"API error processing file {file_details.get('name', file_id)}: {e}")
+                                failed_count += 1
+                        except Exception as e:
+                            log.error(f"Error processing file {file_details.get('name', file_id)}: {e}", exc_info=utils.sample_traceback())
+                            failed_count += 1
+                finally:
+                    # Apply download results in submission order, also when the page is aborted,
+                    # and commit the page's state changes in one transaction
+                    for job in pending_downloads:
+                        _collect_download(*job)
+                    state_map.commit()
+                if page_stats:
+                    log.info(f"Changes page summary: {dict(page_stats)}")
+                
+                # Get next page token
+                page_token = changes_result.get("nextPageToken")
             
-            # Update start token for next run
-            if "newStartPageToken" in changes_result:
-                start_token = changes_result["newStartPageToken"]
+                # Update start token for next run: once a page is committed, the next run can resume after it.
+                # After a page with failures the saved token stops advancing, so the next run retries those files.
+                if "newStartPageToken" in changes_result:
+                    start_token = changes_result["newStartPageToken"]
+                if save_token and failed_count > failed_before_page:
+                    log.warning("Changes page had failures; start token not advanced past it so they are retried next run.")
+                    save_token = False
+                if save_token:
+                    state_manager.save_start_page_token(changes_result.get("newStartPageToken") or page_token, token_file)
                 
-        except HttpError as e:
-            if e.resp.status == 401:
-                log.error(f"Authorization error. Please re-authenticate.")
-                raise
-            elif e.resp.status == 404 and "pageToken not found" in str(e):
-                log.error(f"Invalid page token. Full sync needed.")
-                raise
-            else:
-                log.error(f"API error: {e}")
+            except HttpError as e:
+                if e.resp.status == 401:
+                    log.error(f"Authorization error. Please re-authenticate.")
+                    raise
+                elif e.resp.status == 404 and "pageToken not found" in str(e):
+                    log.error(f"Invalid page token. Full sync needed.")
+                    raise
+                else:
+                    log.error(f"API error: {e}")
+                    failed_count += 1
+                    break
+            except Exception as e:
+                log.error(f"Error processing changes: {e}", exc_info=True)
                 failed_count += 1
                 break
-        except Exception as e:
-            log.error(f"Error processing changes: {e}", exc_info=True)
-            failed_count += 1
-            break
-            
+    finally:
+        # A prefetched page nobody will consume is dropped instead of awaited
+        prefetch_pool.shutdown(wait=False, cancel_futures=True)
+
     return processed_count, downloaded_count, deleted_count, failed_count
 
+def _list_files_page(drive_service: Resource, list_params: Dict[str, Any], drive_name: str, max_retries: int) -> Dict[str, Any]:
+    """Fetches one page of files.list, paced through the shared rate limiter and retried on SSL and server errors."""
+    # Retry logic for API calls with rate limiting
+    limiter = rate_limiter.get_rate_limiter()
+    for retry_attempt in range(max_retries):
+        try:
+            if retry_attempt > 0:
+                log.info(f"🔄 Retry attempt {retry_attempt + 1}/{max_retries} for drive '{drive_name}' API call")
+
+            # Use rate limiter to prevent overwhelming the API
+            with limiter:
+                results = drive_service.files().list(**list_params).execute()
+
+            if retry_attempt > 0:
+                log.info(f"✅ API call succeeded on attempt {retry_attempt + 1} for drive '{drive_name}'")
+            return results
+        except ssl.SSLError as e:
+            # Report SSL error to rate limiter for adaptive throttling
+            limiter.report_ssl_error()
+
+            if retry_attempt < max_retries - 1:
+                # Exponential backoff with longer delays for SSL issues
+                base_delay = min(30, (3 ** retry_attempt))  # Cap at 30 seconds
+                jitter = random.uniform(0, 5)  # Add more jitter
+                wait_time = base_delay + jitter
+                log.warning(f"SSL error during API call for '{drive_name}' (attempt {retry_attempt + 1}/{max_retries}): {e}. Retrying in {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                log.error(f"SSL error during API call for '{drive_name}' after {max_retries} attempts: {e}")
+                raise
+        except HttpError as e:
+            if retry_attempt < max_retries - 1 and e.resp.status >= 500:
+                wait_time = (2 ** retry_attempt) + random.uniform(0, 1)
+                log.warning(f"Server error {e.resp.status} during API call for '{drive_name}' (attempt {retry_attempt + 1}/{max_retries}): {e}. Retrying in {wait_time:.1f}s...")
+                time.sleep(wait_time)
+            else:
+                raise
+
 # --- Full Sync Function ---
 def perform_full_sync(
     drive_service: Resource,
@@ -405,25 +746,139 @@ def perform_full_sync(
     drive_id: Optional[str],
     drive_name: str,
     drive_backup_dir: Path,
-    state_map: Dict[str, Dict[str, Any]], # Pass the state map to populate it
+    state_map: state_manager.DriveState, # Pass the state map to populate it
     processed_shared_drive_ids: Set[str], # To skip shared drive items during My Drive sync
     dry_run: bool = False,
-    max_retries: int = 10  # Increased from 3 to 10 for SSL stability
-) -> Tuple[int, int, int, int, int]: # Returns processed, downloaded, deleted, failed, shortcuts_skipped counts
+    max_retries: int = 10,  # Increased from 3 to 10 for SSL stability
+    creds: Any = None  # Enables parallel downloads (see _submit_download)
+) -> Tuple[int, int, int, int, int, bool]: # Returns processed, downloaded, deleted, failed, shortcuts_skipped counts, listing_complete
     """
     Performs a full sync by listing all files using files.list.
-    Populates the state_map.
-    Returns counts: (processed, downloaded, deleted, failed).
+    Items are processed page by page as the listing proceeds (dry runs sample once the listing is complete).
+    Populates the state_map. Files whose entry in a non-empty state_map shows the same modifiedTime and whose
+    local copy still exists are not downloaded again; entries of items no longer listed are removed.
+    Returns counts: (processed, downloaded, deleted, failed, shortcuts_skipped) and whether the listing completed.
     """
     log.info(f"Performing full sync for drive '{drive_name}' using files.list... {'(DRY RUN)' if dry_run else ''}")
     processed_count = 0
     downloaded_count = 0
-    deleted_count = 0 # Not applicable in full sync from scratch
+    deleted_count = 0 # Stale entries of a reused state_map
     failed_count = 0
     shortcuts_skipped_count = 0
-    all_items_map = {} # Temporary map to hold all fetched items {id: item}
+    listed_count = 0
+    unchanged_count = 0
+    # A state_map kept from an earlier, unfinished sync: unchanged files are reused, unlisted entries pruned
+    reuse_state = bool(state_map)
+    if reuse_state:
+        state_map.begin_listing()
+    listing_complete = False
+    # Dry run only: samples the listed items as they stream by, processed once the listing is complete
+    dry_run_sampler = _DryRunSampler(config.DRY_RUN_SAMPLE_SIZE, config.DRY_RUN_MAX_FILE_SIZE_BYTES)
+
+    # Bound once: the per-item code would otherwise repeat these module attribute lookups for every item
+    folder_mime_type = config.FOLDER_MIME_TYPE
+    reconstruct_path = file_processor.reconstruct_and_create_path
+    local_file_path = file_processor.local_file_path
+    state_entry = state_manager.StateEntry
+    created_dirs: Set[Path] = set() # Directories already created by _ensure_dir
+    is_my_drive_processing = drive_id is None # Shared Drive filtering is decided per drive, not per item
+
+    # File downloads run on the download pool; at most max_pending results are outstanding at a time
+    pending_downloads: Deque[Tuple[Future, str, str, Optional[str], Path]] = deque()
+    in_flight: Dict[Path, Future] = {}
+    max_pending = max(1, config.DOWNLOAD_CONCURRENCY) * 4
+
+    def _collect_download(future: Future, item_id: str, item_name: str, modified_time: Optional[str], local_path_base: Path):
+        """Applies the result of one download to the counters and state_map (main thread only)."""
+        nonlocal downloaded_count, failed_count
+        if in_flight.get(local_path_base) is future:
+            del in_flight[local_path_base]
+        try:
+            success, final_local_path = future.result()
+        except Exception as e:
+            log.error(f"Full Sync: Error processing item {item_name} ({item_id}): {e}", exc_info=utils.sample_traceback())
+            failed_count += 1
+            return
+        if success:
+            downloaded_count += 1
+            # Update state map for file using the final path
+            state_map[item_id] = state_entry(
+                path=str(final_local_path.relative_to(drive_backup_dir)),
+                modified_time=modified_time,
+                is_folder=False
+            )
+        else:
+            failed_count += 1
+            log.error(f"Full Sync: Failed to download/export file {item_name} ({item_id})")
+
+    def _process_item(item: Dict[str, Any]):
+        """Creates a folder or submits a file download for one listed item."""
+        nonlocal processed_count, downloaded_count, failed_count, unchanged_count
+        processed_count += 1
+        item_id = item["id"]
+        item_name = item.get("name", "_unnamed_")
+        mime_type = item.get("mimeType")
+        modified_time = item.get("modifiedTime")
+        is_folder = mime_type == folder_mime_type
+
+        try:
+            # Get local path using the reconstructor
+            local_path_base = reconstruct_path(
+                service=drive_service,
+                item_id=item_id,
+                item_name=item_name,
+                item_parents=item.get("parents"),
+                drive_id=drive_id, # Pass the context drive_id
+                drive_backup_dir=drive_backup_dir
+            )
+
+            if not local_path_base:
+                log.error(f"Full Sync: Failed to get local path for {item_name} ({item_id}). Skipping.")
+                failed_count += 1
+                return
+
+            if is_folder:
+                # Ensure the folder exists locally (reconstruct_and_create_path might create parents, but not the final one)
+                try:
+                    _ensure_dir(local_path_base, created_dirs)
+                except (FileExistsError, NotADirectoryError):
+                     log.error(f"Full Sync: Path for folder {item_name} exists but is not a directory: {local_path_base}. Skipping.")
+                     failed_count += 1
+                     return
+                # Update state map for folder
+                state_map[item_id] = state_entry(
+                    path=str(local_path_base.relative_to(drive_backup_dir)),
+                    modified_time=modified_time,
+                    is_folder=True
+                )
+                downloaded_count += 1 # Count folder creation as "downloaded" activity
+                # No S3 action for folders
+
+            else: # It's a file
+                # Backed up by an earlier sync and not modified since: keep (or move) the local copy
+                prev = state_map.get(item_id) if reuse_state else None
+                if prev is not None and not prev.is_folder and prev.modified_time == modified_time:
+                    new_path = local_file_path(mime_type, local_path_base)
+                    if drive_backup_dir / prev.path != new_path:
+                        # A pending download may still write to the old or new location: finish them before moving
+                        while pending_downloads:
+                            _collect_download(*pending_downloads.popleft())
+                    if _move_unchanged_item(state_map, item_id, prev, new_path, prev.modified_time, drive_backup_dir):
+                        unchanged_count += 1
+                        return
+                # Download/Export the file on the pool; download_file handles adding the extension
+                future = _submit_download(creds, drive_service, gspread_client, item, local_path_base, in_flight)
+                pending_downloads.append((future, item_id, item_name, modified_time, local_path_base))
+                while len(pending_downloads) >= max_pending:
+                    _collect_download(*pending_downloads.popleft())
+
+        except Exception as e:
+            log.error(f"Full Sync: Error processing item {item_name} ({item_id}): {e}", exc_info=utils.sample_traceback())
+            failed_count += 1
 
-    # --- 1. Fetch all items using files.list ---
+    # --- 1. List all items using files.list, processing each page as it arrives ---
+    # The next page is fetched on this drive's own prefetch thread while the current one is processed
+    prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
     try:
         page_token = None
         log.info(f"Fetching full list of objects for drive: '{drive_name}'")
@@ -432,7 +887,7 @@ def perform_full_sync(
             "pageSize": 1000,
             "q": "trashed = false",
             "fields": "nextPageToken, files(id, name, parents, mimeType, modifiedTime, size, driveId)", # Removed shortcutDetails for now
-            "orderBy": "folder, name",
+            # No orderBy: server-side sorting slows every page, and processing does not depend on order
             "supportsAllDrives": True,
             "includeItemsFromAllDrives": True
         }
@@ -442,48 +897,42 @@ def perform_full_sync(
         else:
             list_params["corpora"] = "user" # For My Drive
 
-        # Fetch loop with retry logic
+        # Fetch loop; retries happen per page in _list_files_page
+        next_page: Optional[Future] = None
+        last_progress_log = time.monotonic()
         while True:
             if page_token: list_params["pageToken"] = page_token
             else: list_params.pop("pageToken", None)
 
-            # Retry logic for API calls with rate limiting
-            limiter = rate_limiter.get_rate_limiter()
-            for retry_attempt in range(max_retries):
-                try:
-                    if retry_attempt > 0:
-                        log.info(f"🔄 Retry attempt {retry_attempt + 1}/{max_retries} for drive '{drive_name}' API call")
-                    
-                    # Use rate limiter to prevent overwhelming the API
-                    with limiter:
-                        results = drive_service.files().list(**list_params).execute()
-                    
-                    items = results.get("files", [])
-                    if retry_attempt > 0:
-                        log.info(f"✅ API call succeeded on attempt {retry_attempt + 1} for drive '{drive_name}'")
-                    break  # Success, exit retry loop
-                except ssl.SSLError as e:
-                    # Report SSL error to rate limiter for adaptive throttling
-                    limiter.report_ssl_error()
-                    
-                    if retry_attempt < max_retries - 1:
-                        # Exponential backoff with longer delays for SSL issues
-                        base_delay = min(30, (3 ** retry_attempt))  # Cap at 30 seconds
-                        jitter = random.uniform(0, 5)  # Add more jitter
-                        wait_time = base_delay + jitter
-                        log.warning(f"SSL error during API call for '{drive_name}' (attempt {retry_attempt + 1}/{max_retries}): {e}. Retrying in {wait_time:.1f}s...")
-                        time.sleep(wait_time)
-                    else:
-                        log.error(f"SSL error during API call for '{drive_name}' after {max_retries} attempts: {e}")
-                        raise
-                except HttpError as e:
-                    if retry_attempt < max_retries - 1 and e.resp.status >= 500:
-                        wait_time = (2 ** retry_attempt) + random.uniform(0, 1)
-                        log.warning(f"Server error {e.resp.status} during API call for '{drive_name}' (attempt {retry_attempt + 1}/{max_retries}): {e}. Retrying in {wait_time:.1f}s...")
-                        time.sleep(wait_time)
-                    else:
-                        raise
+            # The page prefetched during the previous iteration, if any
+            if next_page is not None:
+                results = next_page.result()
+                next_page = None
+            else:
+                results = _list_files_page(drive_service, list_params, drive_name, max_retries)
+            items = results.get("files", [])
+            page_token = results.get("nextPageToken")
+            # Fetch the following page while this one is processed
+            if page_token:
+                next_page = _prefetch_page(prefetch_pool, creds, _list_files_page, {**list_params, "pageToken": page_token}, drive_name, max_retries)
+
+            # Listed folders are parents of later items: cache them instead of fetching them again.
+            # Remaining uncached parent folders are resolved in batched requests up front (a dry run
+            # only processes its sample once the listing is complete, so it skips this)
+            file_processor.cache_listed_folders(items)
+            if not dry_run:
+                file_processor.prefetch_parents(
+                    drive_service,
+                    (item["parents"][0] for item in items
+                     if item.get("parents") and not (is_my_drive_processing and item.get("driveId"))),
+                    drive_id
+                )
+
+            # Process the page grouped by parent folder, folders first: consecutive writes land in the same
+            # directory, and a folder is created before the files listed with it
+            items.sort(key=lambda item: (item.get("mimeType") != folder_mime_type, (item.get("parents") or ("",))[0], item.get("name", "")))
 
+            skipped_shared = 0
             for item in items:
                 # Skip shortcuts (though field wasn't requested, good practice)
                 if item.get("mimeType") == "application/vnd.google-apps.shortcut":
@@ -491,11 +940,10 @@ def perform_full_sync(
                     continue
 
                 # --- Filter out Shared Drive items when processing 'My Drive' ---
-                is_my_drive_processing = drive_id is None
                 item_belongs_to_shared_drive_id = item.get("driveId")
                 if is_my_drive_processing and item_belongs_to_shared_drive_id:
                     if item_belongs_to_shared_drive_id in processed_shared_drive_ids:
-                         # Skip debug logging to reduce spam
+                         skipped_shared += 1
                          continue # Skip this item, it belongs to a drive processed elsewhere
                     else:
                          # Handle item belonging to a shared drive NOT processed separately
@@ -504,14 +952,14 @@ def perform_full_sync(
                          if processed_count < 5:
                              log.warning(f"Item '{item_name}' ({item['id']}) found during 'My Drive' sync belongs to Shared Drive {item_belongs_to_shared_drive_id} (NOT processed separately). Downloading to '{config.SHARED_FILES_DIR_NAME}'.")
                          target_dir = config.SHARED_FILES_DIR / item_belongs_to_shared_drive_id # Subfolder per drive ID
-                         target_dir.mkdir(parents=True, exist_ok=True)
+                         _ensure_dir(target_dir, created_dirs)
                          target_path_base = target_dir / utils.sanitize_filename(item_name)
                          mime_type = item.get("mimeType")
 
                          processed_count += 1 # Count as processed
-                         if mime_type == config.FOLDER_MIME_TYPE:
+                         if mime_type == folder_mime_type:
                              try:
-                                 target_path_base.mkdir(parents=True, exist_ok=True)
+                                 _ensure_dir(target_path_base, created_dirs)
                                  downloaded_count += 1 # Count folder creation
                              except OSError as e:
                                  log.error(f"Failed to create folder in Shared With Me dir: {target_path_base} - {e}")
@@ -533,130 +981,57 @@ def perform_full_sync(
                              failed_count += 1
                          continue # Skip normal processing and state map update
 
-                # Store valid items for normal processing
-                all_items_map[item["id"]] = item
+                # Process valid items right away; a dry run samples them once the listing is complete
+                listed_count += 1
+                if reuse_state:
+                    state_map.mark_listed(item["id"])
+                if dry_run:
+                    dry_run_sampler.add(item)
+                else:
+                    _process_item(item)
+            if skipped_shared:
+                log.info(f"Skipped {skipped_shared} items belonging to Shared Drives processed separately.")
+
+            # Report progress between pages, at most every PROGRESS_LOG_INTERVAL seconds
+            # (the total is not known while the listing is still running)
+            now = time.monotonic()
+            if now - last_progress_log >= PROGRESS_LOG_INTERVAL:
+                last_progress_log = now
+                log.info(f"Full sync progress: {processed_count} items processed, {listed_count} listed, "
+                         f"{downloaded_count} downloaded, {failed_count} failed")
 
-            page_token = results.get("nextPageToken")
             if not page_token: break
-        log.info(f"Found {len(all_items_map)} total objects for full sync on '{drive_name}'.")
+        listing_complete = True
+        log.info(f"Listed {listed_count} total objects for full sync on '{drive_name}'.")
+        if reuse_state:
+            # Items deleted on Drive since the state was written
+            deleted_count += state_map.prune_unlisted()
 
     except HttpError as error:
         log.error(f"API error during full scan of '{drive_name}': {error}. Full sync aborted.", exc_info=True)
-        return processed_count, downloaded_count, deleted_count, 1, shortcuts_skipped_count # Return 1 failure
+        failed_count += 1
     except ssl.SSLError as e:
         log.error(f"SSL connection error during full scan of '{drive_name}': {e}. Full sync aborted.")
-        return processed_count, downloaded_count, deleted_count, 1, shortcuts_skipped_count # Return 1 failure
+        failed_count += 1
     except Exception as e:
         log.error(f"Unknown error during full scan of '{drive_name}': {e}. Full sync aborted.", exc_info=True)
-        return processed_count, downloaded_count, deleted_count, 1, shortcuts_skipped_count # Return 1 failure
-
-    # --- 1.5 Item Sampling for Dry Run ---
-    items_to_process_list = list(all_items_map.values())
-    if dry_run:
-        # Separate folders and files meeting size criteria
-        folders = [item for item in items_to_process_list if item.get("mimeType") == config.FOLDER_MIME_TYPE]
-        small_files = [
-            item for item in items_to_process_list
-            if item.get("mimeType") != config.FOLDER_MIME_TYPE and int(item.get("size", 0)) <= config.DRY_RUN_MAX_FILE_SIZE_BYTES
-        ]
-        # Sort small files by size (optional, but helps select smallest first)
-        small_files.sort(key=lambda x: int(x.get("size", 0)))
-        
-        # Build the sampled list
-        sampled_items = []
-        # Sample some folders (e.g., up to half the sample size)
-        sampled_items.extend(random.sample(folders, min(len(folders), config.DRY_RUN_SAMPLE_SIZE // 2)))
-        # Fill remaining sample slots with the smallest files
-        remaining_sample_size = config.DRY_RUN_SAMPLE_SIZE - len(sampled_items)
-        if remaining_sample_size > 0:
-            sampled_items.extend(small_files[:min(len(small_files), remaining_sample_size)])
-        
-        # Handle edge case: if no folders/small files, sample randomly from all items
-        if not sampled_items and items_to_process_list:
-            log.warning("[DRY RUN] No folders or small files found for sampling. Sampling randomly from all items.")
-            sampled_items = random.sample(items_to_process_list, min(len(items_to_process_list), config.DRY_RUN_SAMPLE_SIZE))
-            
-        items_to_process_list = sampled_items # Replace the list with the sampled items
-        log.info(f"[DRY RUN] Selected {len(items_to_process_list)} items for processing based on sampling rules.")
-
-    # --- 2. Process all fetched (or sampled) items ---
-    log.info(f"Processing {len(items_to_process_list)} items for full sync on '{drive_name}'...")
-    
-    # Progress reporting
-    total_items = len(items_to_process_list)
-    last_progress_report = 0
-
-    for item in items_to_process_list:
-        processed_count += 1
-        item_id = item["id"]
-        item_name = item.get("name", "_unnamed_")
-        mime_type = item.get("mimeType")
-        is_folder = mime_type == config.FOLDER_MIME_TYPE
-        
-        # Report progress every 10% or every 500 items
-        progress_percentage = (processed_count * 100) // total_items
-        if progress_percentage >= last_progress_report + 10 or processed_count % 500 == 0:
-            log.info(f"Full sync progress: {processed_count}/{total_items} ({progress_percentage}%) - Current: {item_name[:50]}...")
-            last_progress_report = progress_percentage
+        failed_count += 1
+    finally:
+        prefetch_pool.shutdown(wait=False, cancel_futures=True)
 
-        try:
-            # Get local path using the reconstructor
-            local_path_base = file_processor.reconstruct_and_create_path(
-                service=drive_service,
-                item_id=item_id,
-                item_name=item_name,
-                item_parents=item.get("parents"),
-                drive_id=drive_id, # Pass the context drive_id
-                drive_backup_dir=drive_backup_dir
-            )
-
-            if not local_path_base:
-                log.error(f"Full Sync: Failed to get local path for {item_name} ({item_id}). Skipping.")
-                failed_count += 1
-                continue
-
-            if is_folder:
-                # Ensure the folder exists locally (reconstruct_and_create_path might create parents, but not the final one)
-                if not local_path_base.exists():
-                    local_path_base.mkdir(parents=True, exist_ok=True)
-                elif not local_path_base.is_dir():
-                     log.error(f"Full Sync: Path for folder {item_name} exists but is not a directory: {local_path_base}. Skipping.")
-                     failed_count += 1
-                     continue
-                # Update state map for folder
-                state_map[item_id] = {
-                    "path": str(local_path_base.relative_to(drive_backup_dir)),
-                    "modifiedTime": item.get("modifiedTime"),
-                    "is_folder": True
-                }
-                downloaded_count += 1 # Count folder creation as "downloaded" activity
-                # No S3 action for folders
-
-            else: # It's a file
-                # Download/Export the file (includes potential S3 upload)
-                # download_file handles adding the extension
-                success, final_local_path = file_processor.download_file(
-                    service=drive_service,
-                    item=item,
-                    local_path_base=local_path_base, # Pass the path without extension initially
-                    gspread_client=gspread_client
-                )
-
-                if success:
-                    downloaded_count += 1
-                    # Update state map for file using the final path
-                    state_map[item_id] = {
-                        "path": str(final_local_path.relative_to(drive_backup_dir)),
-                        "modifiedTime": item.get("modifiedTime"),
-                        "is_folder": False
-                    }
-                else:
-                    failed_count += 1
-                    log.error(f"Full Sync: Failed to download/export file {item_name} ({item_id})")
+    # --- 2. Item Sampling for Dry Run ---
+    if dry_run and listing_complete:
+        sampled_items = dry_run_sampler.sample()
+        if dry_run_sampler.fell_back:
+            log.warning("[DRY RUN] No folders or small files found for sampling. Sampling randomly from all items.")
+        log.info(f"[DRY RUN] Selected {len(sampled_items)} items for processing based on sampling rules.")
+        for item in sampled_items:
+            _process_item(item)
 
-        except Exception as e:
-            log.error(f"Full Sync: Error processing item {item_name} ({item_id}): {e}", exc_info=True)
-            failed_count += 1
+    while pending_downloads:
+        _collect_download(*pending_downloads.popleft())
 
+    if unchanged_count:
+        log.info(f"Full sync for '{drive_name}': {unchanged_count} unchanged files kept from the previous backup.")
     log.info(f"Full sync processing for '{drive_name}' finished.")
-    return processed_count, downloaded_count, deleted_count, failed_count, shortcuts_skipped_count
+    return processed_count, downloaded_count, deleted_count, failed_count, shortcuts_skipped_count, listing_complete
@@ -1,27 +1,52 @@
 # -*- coding: utf-8 -*-
 
-import re
+import itertools
+
+# Per-item error logs attach a traceback to the first few errors of a run only (see sample_traceback)
+ITEM_TRACEBACK_LIMIT = 10
+_item_tracebacks = itertools.count()
+
+# sanitize_filename translation table:
+# - characters invalid in Windows/Linux/macOS filenames become "_"
+# - colons, often used in timestamps, become hyphens
+# - control characters are removed
+_SANITIZE_TABLE = str.maketrans({
+    **dict.fromkeys('\\/*?"<>|', "_"),
+    ":": "-",
+    **dict.fromkeys(map(chr, [*range(0x20), 0x7f])),
+})
 
 # --- Helper Functions ---
-def int_to_column_letter(n: int) -> str:
-    """Converts a 1-based integer to an Excel-style column letter (A, B, ..., Z, AA, AB, ...)."""
-    string = ""
+def sample_traceback() -> bool:
+    """
+    Returns True for the first ITEM_TRACEBACK_LIMIT calls, False afterwards. Per-item error handlers pass it
+    as exc_info, so a storm of failing files does not spend its time formatting tracebacks.
+    """
+    return next(_item_tracebacks) < ITEM_TRACEBACK_LIMIT
+
+def _compute_column_letter(n: int) -> str:
+    letters = []
     while n > 0:
         n, remainder = divmod(n - 1, 26)
-        string = chr(65 + remainder) + string
-    return string
+        letters.append(chr(65 + remainder))
+    return "".join(reversed(letters))
+
+# Column letters A..ZZ (1..702), which covers the width of practically every sheet
+_COLUMN_LETTERS = tuple(_compute_column_letter(n) for n in range(1, 703))
+
+def int_to_column_letter(n: int) -> str:
+    """Converts a 1-based integer to an Excel-style column letter (A, B, ..., Z, AA, AB, ...)."""
+    if 0 < n <= len(_COLUMN_LETTERS):
+        return _COLUMN_LETTERS[n - 1]
+    return _compute_column_letter(n)
 
 def sanitize_filename(name: str) -> str:
     """Removes or replaces characters that are invalid in filenames on common OS."""
-    # Remove characters invalid in Windows/Linux/macOS filenames
-    name = re.sub(r'[\\/*?"<>|]', "_", name)
-    # Replace colons, often used in timestamps, with hyphens
-    name = name.replace(":", "-")
-    # Remove control characters
-    name = re.sub(r"[\x00-\x1f\x7f]", "", name)
+    # One C-level pass replaces the invalid characters, colons and control characters
+    name = name.translate(_SANITIZE_TABLE)
     # Remove leading/trailing dots and spaces (problematic on Windows)
     name = name.strip(". ")
     # Handle empty names after sanitization
     if not name:
         name = "_unnamed_"
-    return name 
\ No newline at end of file
+    return name